@@ -0,0 +1,205 @@
+'''
+Async chunk fetcher shared by the Coinbase fetch scripts.
+
+Splits a time range into 300-candle windows, keeps several window requests in flight
+at once, paces them with the shared AIMD pacer from retry_policy (so we stay just under
+Coinbase's public rate limit and back off on 429s), and hands the candles back in timestamp order.
+
+Windows that are fully in the past are served from / saved to the on-disk response cache
+(response_cache.py), so re-runs only hit the API for chunks they don't have yet.
+
+Candles come back as (n, 6) float64 arrays in Coinbase column order, decoded straight from
+the response bytes by candle_decoder (use candles_to_frame() to get a DataFrame).
+
+Usage:
+    from async_fetcher import fetch_candles, iter_candle_batches
+    candles = fetch_candles("BTC-USD", 60, start_ts, end_ts)      # small ranges, all in memory
+
+    for batch in iter_candle_batches("BTC-USD", 60, start_ts, end_ts):
+        write(candles_to_frame(batch))                           # long backfills, flat memory
+
+Tune with FETCH_CONCURRENCY in your .env (rate / retry settings: see retry_policy.py).
+'''
+
+# ===== Imports =====
+import asyncio
+import datetime
+import os
+from collections import deque
+import numpy as np
+from candle_decoder import EMPTY, decode_candles
+from http_client import BASE_URL, get_session
+from response_cache import get_cache, is_final
+from retry_policy import RETRY_STATUSES, AdaptivePacer, get_budget, get_pacer, retry_delay
+
+# === CONFIG ===
+MAX_CANDLES = 300  # Coinbase returns at most 300 candles per request
+MAX_IN_FLIGHT = int(os.getenv("FETCH_CONCURRENCY", "6"))
+CHUNKS_PER_BATCH = 10  # chunks handed to the sink at a time when streaming
+
+
+def chunk_windows(start_ts, end_ts, granularity):
+    """Split [start_ts, end_ts) into (start, end) windows of at most 300 candles.
+    Boundaries sit on a fixed epoch grid so the same windows come back on every run."""
+    chunk_seconds = MAX_CANDLES * granularity
+    windows = []
+    current_start_ts = start_ts
+    while current_start_ts < end_ts:
+        next_boundary = (current_start_ts // chunk_seconds + 1) * chunk_seconds
+        current_end_ts = min(next_boundary, end_ts)
+        windows.append((current_start_ts, current_end_ts))
+        current_start_ts = current_end_ts
+    return windows
+
+
+async def _fetch_window(symbol, granularity, window, pacer, budget, semaphore, cache):
+    start_dt = datetime.datetime.utcfromtimestamp(window[0])
+    end_dt = datetime.datetime.utcfromtimestamp(window[1])
+    params = {
+        'start': start_dt.isoformat(),
+        'end': end_dt.isoformat(),
+        'granularity': str(granularity)
+    }
+    url = f"{BASE_URL}/products/{symbol}/candles"
+    if cache is not None:
+        body = cache.get(url, granularity, window)
+        if body is not None:
+            return decode_candles(body)
+    session = get_session()  # pooled keep-alive connections shared by all chunks
+
+    async with semaphore:
+        print(f"📊 Fetching from {start_dt} to {end_dt}")
+
+        # === ✅ Robust retry (429 / 5xx, jittered backoff, shared budget) ===
+        attempt = 0
+        while True:
+            await asyncio.sleep(pacer.reserve())
+            response = await asyncio.to_thread(session.get, url, params=params)
+            wait_sec = retry_delay(response, attempt, pacer, budget)
+
+            if response.status_code == 200:
+                if cache is not None and is_final(window, granularity):
+                    cache.put(url, granularity, window, response.content)
+                return decode_candles(response.content)
+            elif wait_sec is not None:
+                print(f"⚠️  {response.status_code} error → retrying in {wait_sec:.1f} sec ({pacer.rate:.1f} req/s)...")
+                await asyncio.sleep(wait_sec)
+                attempt += 1
+            elif response.status_code in RETRY_STATUSES:
+                break
+            else:
+                raise Exception(f"API Error: {response.status_code} - {response.text}")
+
+    print(f"⚠️  Giving up on chunk {start_dt} to {end_dt} after retries. Skipping.")
+    return None
+
+
+def reassemble(chunks):
+    "Merge fetched chunks into one array sorted by candle time, dropping boundary duplicates"
+    chunks = [c for c in chunks if c is not None and len(c)]
+    if not chunks:
+        return EMPTY
+    rows = np.concatenate(chunks)
+    _, keep = np.unique(rows[:, 0], return_index=True)  # sorted + first of each timestamp
+    return rows[keep]
+
+
+def iter_chunks(symbol, granularity, start_ts, end_ts,
+                max_in_flight=MAX_IN_FLIGHT, rate=None, skip=None):
+    """Yield (window, candles) in window order, keeping at most 2 x max_in_flight chunks in memory.
+    candles is None for a chunk we gave up on after retries. Windows in `skip` are not fetched."""
+    all_windows = chunk_windows(int(start_ts), int(end_ts), granularity)
+    if skip:
+        total = len(all_windows)
+        all_windows = [w for w in all_windows if w not in skip]
+        print(f"⏭️  Skipping {total - len(all_windows)} chunks already done")
+    return iter_window_chunks(symbol, granularity, all_windows, max_in_flight, rate)
+
+
+def iter_window_chunks(symbol, granularity, windows,
+                       max_in_flight=MAX_IN_FLIGHT, rate=None):
+    """Fetch an explicit list of (start, end) windows; yields (window, candles) in the given order.
+    Paced by the process-wide AIMD pacer unless a starting `rate` is given."""
+    pacer = get_pacer() if rate is None else AdaptivePacer(rate)
+    budget = get_budget()
+    cache = get_cache()
+    print(f"🚚 {len(windows)} chunks to fetch ({max_in_flight} in flight, {pacer.rate:.1f} req/s)")
+    windows = iter(windows)
+    lookahead = max_in_flight * 2
+
+    hits_before = cache.hits if cache is not None else 0
+    loop = asyncio.new_event_loop()
+    pending = deque()
+    try:
+        semaphore = asyncio.Semaphore(max_in_flight)
+
+        def refill():
+            while len(pending) < lookahead:
+                window = next(windows, None)
+                if window is None:
+                    return
+                task = loop.create_task(_fetch_window(symbol, granularity, window, pacer, budget, semaphore, cache))
+                pending.append((window, task))
+
+        refill()
+        while pending:
+            window, task = pending.popleft()
+            candles = loop.run_until_complete(task)
+            refill()
+            yield window, candles
+        if cache is not None and cache.hits > hits_before:
+            print(f"💾 {cache.hits - hits_before} chunks served from the response cache")
+    finally:
+        for _, task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*(t for _, t in pending), return_exceptions=True))
+        loop.close()
+
+
+def iter_candle_batches(symbol, granularity, start_ts, end_ts,
+                        chunks_per_batch=CHUNKS_PER_BATCH,
+                        max_in_flight=MAX_IN_FLIGHT, rate=None, manifest=None, destination=None):
+    """Yield lists of candles, oldest first and without boundary duplicates, a few chunks at a time.
+
+    With a ChunkManifest, windows already persisted to `destination` (the sink's file / table) are skipped
+    and a batch's windows are marked done once the caller asks for the next batch (i.e. after it has
+    persisted this one)."""
+    skip = manifest.done_windows(symbol, granularity, destination) if manifest else None
+    batch = []
+    batch_windows = []
+    chunks_in_batch = 0
+    last_ts = None
+
+    for window, candles in iter_chunks(symbol, granularity, start_ts, end_ts, max_in_flight, rate, skip):
+        if candles is not None and len(candles):
+            if last_ts is not None:
+                candles = candles[candles[:, 0] > last_ts]  # chunk ends are inclusive → drop repeats
+            if len(candles):
+                batch.append(candles)
+                last_ts = candles[-1, 0]
+        if candles is not None:
+            batch_windows.append(window)
+
+        chunks_in_batch += 1
+        if chunks_in_batch >= chunks_per_batch:
+            if batch:
+                yield np.concatenate(batch)
+            if manifest:
+                manifest.mark_done(symbol, granularity, destination, batch_windows)
+            batch = []
+            batch_windows = []
+            chunks_in_batch = 0
+
+    if batch:
+        yield np.concatenate(batch)
+    if manifest and batch_windows:
+        manifest.mark_done(symbol, granularity, destination, batch_windows)
+
+
+def fetch_candles(symbol, granularity, start_ts, end_ts,
+                  max_in_flight=MAX_IN_FLIGHT, rate=None):
+    "Fetch raw Coinbase candles for [start_ts, end_ts) as one (n, 6) array, oldest first"
+    batches = list(iter_candle_batches(symbol, granularity, start_ts, end_ts,
+                                       max_in_flight=max_in_flight, rate=rate))
+    return np.concatenate(batches) if batches else EMPTY
@@ -0,0 +1,330 @@
+'''
+Ingestion benchmark: times each pipeline stage on synthetic data (and end to end), and
+records candles/sec + peak RSS so runs can be compared after every change.
+
+Stages:
+    fetch       chunk fetch from the local fake API (fake_coinbase_server.py)
+    parse       Coinbase JSON responses → DataFrame
+    csv_write   streaming CSV writes (CsvSink)
+    merge       merge_append.py on the synthetic historical + append files
+    end_to_end  fetch → CSV → merge_append.py
+    pg_load     historical_to_postgres.py          (BENCH_DB=true, uses DB_* from .env)
+    promote     raw → historical promotion         (BENCH_DB=true)
+
+Every stage runs in its own process so peak RSS is per stage. Postgres stages only touch
+tables named bench{N}usd_1m / bench{N}usd_1m_raw.
+
+    python scripts/benchmark_pipeline.py
+    BENCH_PAIRS=8 BENCH_YEARS=3 python scripts/benchmark_pipeline.py
+    BENCH_STAGES=parse,csv_write python scripts/benchmark_pipeline.py
+
+Results are appended to data/benchmarks/results.jsonl (one JSON line per run) and
+compared with the previous run at the same scale.
+'''
+
+# ===== Imports =====
+import contextlib
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import pandas as pd
+
+# === CONFIG ===
+project_root = Path(__file__).resolve().parent.parent
+scripts_dir = project_root / "scripts"
+RESULTS_FILE = project_root / "data" / "benchmarks" / "results.jsonl"
+
+BENCH_PAIRS = int(os.getenv("BENCH_PAIRS", "4"))
+BENCH_YEARS = float(os.getenv("BENCH_YEARS", "1"))
+BENCH_APPEND_DAYS = int(os.getenv("BENCH_APPEND_DAYS", "2"))        # new rows per pair for merge
+BENCH_FETCH_DAYS = int(os.getenv("BENCH_FETCH_DAYS", "30"))         # 1m days fetched from the fake API
+BENCH_FETCH_RATE = float(os.getenv("BENCH_FETCH_RATE", "50"))       # req/s allowed against the fake API
+BENCH_LATENCY_MS = float(os.getenv("BENCH_LATENCY_MS", "30"))       # simulated API latency
+BENCH_DB = os.getenv("BENCH_DB", "False").lower() == "true"
+BENCH_STAGES = os.getenv("BENCH_STAGES", "fetch,parse,csv_write,merge,end_to_end,pg_load,promote").split(",")
+DB_STAGES = ["pg_load", "promote"]
+os.environ.setdefault("RESPONSE_CACHE", "false")  # time real fetches, not response cache hits
+
+END_TS = 1735689600  # 2025-01-01, fixed so datasets are identical between runs
+
+
+def pair_names():
+    return [f"BENCH{i}USD" for i in range(BENCH_PAIRS)]
+
+
+def peak_rss_mb(children=False):
+    "Peak resident memory of this process (or its finished children) in MB"
+    try:
+        import resource
+    except ImportError:  # Windows
+        if children:
+            return None
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / 1024 / 1024, 1)
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    kb = resource.getrusage(who).ru_maxrss
+    return round(kb / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def synthetic_frame(pair, start_ts, end_ts):
+    "Deterministic 1m candles as a historical-style DataFrame"
+    from fake_coinbase_server import minute_candles
+    t, low, high, open_, close, volume = minute_candles(pair, start_ts, end_ts, gap_rate=0.0005)
+    df = pd.DataFrame({
+        'datetime': pd.to_datetime(t, unit='s'),
+        'open': open_.round(6), 'high': high.round(6), 'low': low.round(6),
+        'close': close.round(6), 'volume': volume.round(8),
+    })
+    return df.set_index('datetime')
+
+
+def prepare_dataset(workdir):
+    "historical/ = BENCH_YEARS of 1m per pair, append/ = the last BENCH_APPEND_DAYS (one day overlapping)"
+    hist_start = END_TS - int(BENCH_YEARS * 365 * 86400)
+    hist_end = END_TS - 86400 * (BENCH_APPEND_DAYS - 1)
+    for sub in ["historical", "append"]:
+        (workdir / sub).mkdir(parents=True, exist_ok=True)
+    for pair in pair_names():
+        synthetic_frame(pair, hist_start, hist_end).to_csv(workdir / "historical" / f"{pair}-1m=historical-data.csv")
+        synthetic_frame(pair, END_TS - 86400 * BENCH_APPEND_DAYS, END_TS).to_csv(
+            workdir / "append" / f"{pair}-1m=new-data.csv")
+
+
+def run_script(script, env_overrides):
+    "Run one of the pipeline scripts quietly; returns wall seconds"
+    env = os.environ.copy()
+    env.update(env_overrides)
+    started = time.perf_counter()
+    subprocess.run([sys.executable, str(scripts_dir / script)], check=True, env=env,
+                   stdout=subprocess.DEVNULL, cwd=project_root)
+    return time.perf_counter() - started
+
+
+def copy_dataset(workdir, name):
+    target = workdir / name
+    shutil.copytree(workdir / "historical", target / "historical")
+    shutil.copytree(workdir / "append", target / "append")
+    return target
+
+
+def count_rows(folder, pattern):
+    return sum(sum(1 for _ in open(f)) - 1 for f in folder.glob(pattern))
+
+
+# === Stages (each returns (candles, seconds, rss_from_children)) ===
+def stage_fetch(workdir):
+    from fake_coinbase_server import start_server
+    server, base_url = start_server(latency_ms=BENCH_LATENCY_MS)
+    import http_client
+    import async_fetcher
+    async_fetcher.BASE_URL = http_client.BASE_URL = base_url
+
+    start_ts = END_TS - BENCH_FETCH_DAYS * 86400
+    started = time.perf_counter()
+    candles = 0
+    for batch in async_fetcher.iter_candle_batches("BTC-USD", 60, start_ts, END_TS, rate=BENCH_FETCH_RATE):
+        candles += len(batch)
+    seconds = time.perf_counter() - started
+    server.shutdown()
+    return candles, seconds, False
+
+
+def parse_responses(bodies):
+    "The fetch scripts' parse path: response bytes → typed columns → DataFrame"
+    from candle_decoder import CandleColumns, decode_candles
+    columns = CandleColumns(len(bodies) * 300)
+    for body in bodies:
+        columns.append(decode_candles(body))
+    return columns.to_frame()
+
+
+def stage_parse(workdir):
+    from fake_coinbase_server import candles as fake_candles
+    start_ts = END_TS - int(BENCH_YEARS * 365 * 86400)
+    bodies = [
+        json.dumps(fake_candles("BTC-USD", ts, ts + 299 * 60, 60, 0.0005)).encode()
+        for ts in range(start_ts, END_TS, 300 * 60)
+    ]
+    started = time.perf_counter()
+    df = parse_responses(bodies)
+    return len(df), time.perf_counter() - started, False
+
+
+def stage_csv_write(workdir):
+    from candle_sinks import CsvSink
+    start_ts = END_TS - int(BENCH_YEARS * 365 * 86400)
+    frames = [synthetic_frame(pair, start_ts, END_TS) for pair in pair_names()]
+    out_dir = workdir / "csv_write"
+    started = time.perf_counter()
+    rows = 0
+    for pair, df in zip(pair_names(), frames):
+        sink = CsvSink(out_dir / f"{pair}-1m=raw-data.csv")
+        for i in range(0, len(df), 3000):  # 10 chunks per batch, like iter_candle_batches
+            sink.write(df.iloc[i:i + 3000])
+        sink.close()
+        rows += sink.rows
+    return rows, time.perf_counter() - started, False
+
+
+def stage_merge(workdir):
+    data_dir = copy_dataset(workdir, "merge")
+    rows = count_rows(data_dir / "historical", "*.csv") + count_rows(data_dir / "append", "*.csv")
+    seconds = run_script("merge_append.py", {"DATA_DIR": str(data_dir)})
+    return rows, seconds, True
+
+
+def stage_end_to_end(workdir):
+    from fake_coinbase_server import start_server
+    from candle_sinks import CsvSink
+    from candle_decoder import candles_to_frame
+    server, base_url = start_server(latency_ms=BENCH_LATENCY_MS)
+    import http_client
+    import async_fetcher
+    async_fetcher.BASE_URL = http_client.BASE_URL = base_url
+
+    data_dir = copy_dataset(workdir, "end_to_end")
+    for f in (data_dir / "append").glob("*.csv"):
+        f.unlink()
+    days = min(BENCH_FETCH_DAYS, BENCH_APPEND_DAYS + 1)
+
+    started = time.perf_counter()
+    rows = 0
+    for pair in pair_names():
+        symbol = f"{pair[:-3]}-USD"
+        sink = CsvSink(data_dir / "append" / f"{pair}-1m=new-data.csv")
+        for batch in async_fetcher.iter_candle_batches(symbol, 60, END_TS - days * 86400, END_TS,
+                                                       rate=BENCH_FETCH_RATE):
+            sink.write(candles_to_frame(batch))
+        sink.close()
+        rows += sink.rows
+    server.shutdown()
+    run_script("merge_append.py", {"DATA_DIR": str(data_dir)})
+    return rows, time.perf_counter() - started, True
+
+
+def stage_pg_load(workdir):
+    rows = count_rows(workdir / "historical", "*.csv")
+    seconds = run_script("historical_to_postgres.py", {"DATA_DIR": str(workdir)})
+    return rows, seconds, True
+
+
+def stage_promote(workdir):
+    from db_utils import connect, copy_candles, create_candle_table, create_raw_table, promote_many, transaction
+    conn = connect()
+    cur = conn.cursor()
+    tables = []
+    for pair in pair_names():
+        hist, raw = f"{pair.lower()}_1m", f"{pair.lower()}_1m_raw"
+        create_candle_table(cur, hist)
+        create_raw_table(cur, raw)
+        cur.execute(f"TRUNCATE TABLE {raw};")
+        copy_candles(cur, raw, workdir / "append" / f"{pair}-1m=new-data.csv")
+        cur.execute(f"SELECT COALESCE(MAX(datetime), '1970-01-01') FROM {hist};")
+        tables.append((hist, raw, cur.fetchone()[0]))
+
+    started = time.perf_counter()
+    with transaction(cur):
+        rows = sum(inserted for inserted, _ in promote_many(cur, tables))
+    seconds = time.perf_counter() - started
+    cur.close()
+    conn.close()
+    return rows, seconds, False
+
+
+STAGES = {
+    "fetch": stage_fetch,
+    "parse": stage_parse,
+    "csv_write": stage_csv_write,
+    "merge": stage_merge,
+    "end_to_end": stage_end_to_end,
+    "pg_load": stage_pg_load,
+    "promote": stage_promote,
+}
+
+
+def run_stage_child(name, workdir, out_file):
+    "Entry point inside the per-stage process"
+    sys.path.insert(0, str(scripts_dir))
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        candles, seconds, from_children = STAGES[name](Path(workdir))
+    result = {
+        "candles": candles,
+        "seconds": round(seconds, 3),
+        "candles_per_sec": round(candles / seconds, 1) if seconds else None,
+        "peak_rss_mb": peak_rss_mb(children=from_children),
+    }
+    Path(out_file).write_text(json.dumps(result))
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def previous_run(scale):
+    if not RESULTS_FILE.exists():
+        return None
+    runs = [json.loads(line) for line in RESULTS_FILE.read_text().splitlines() if line.strip()]
+    runs = [r for r in runs if r["scale"] == scale]
+    return runs[-1] if runs else None
+
+
+def main():
+    scale = {"pairs": BENCH_PAIRS, "years": BENCH_YEARS, "append_days": BENCH_APPEND_DAYS,
+             "fetch_days": BENCH_FETCH_DAYS, "fetch_rate": BENCH_FETCH_RATE, "latency_ms": BENCH_LATENCY_MS}
+    stages = [s.strip() for s in BENCH_STAGES if s.strip() in STAGES]
+    if not BENCH_DB:
+        stages = [s for s in stages if s not in DB_STAGES]
+
+    print(f"🏁 Benchmark: {BENCH_PAIRS} pairs × {BENCH_YEARS} years of 1m | stages: {', '.join(stages)}")
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="coinbase_bench_") as tmp:
+        workdir = Path(tmp)
+        print("🧪 Generating synthetic dataset...")
+        prepare_dataset(workdir)
+
+        for name in stages:
+            out_file = workdir / f"{name}.json"
+            print(f"⏱️  {name}...", end=" ", flush=True)
+            subprocess.run([sys.executable, __file__, "--stage", name, str(workdir), str(out_file)], check=True)
+            results[name] = json.loads(out_file.read_text())
+            r = results[name]
+            print(f"{r['candles']:,} candles in {r['seconds']}s → {r['candles_per_sec']:,} candles/s, "
+                  f"peak RSS {r['peak_rss_mb']} MB")
+
+    # === Compare with the previous run ===
+    previous = previous_run(scale)
+    if previous:
+        print(f"\n📊 vs previous run ({previous['run_at']}, {previous['git_commit']}):")
+        for name, r in results.items():
+            before = previous["stages"].get(name)
+            if before and before["candles_per_sec"] and r["candles_per_sec"]:
+                change = (r["candles_per_sec"] / before["candles_per_sec"] - 1) * 100
+                print(f"   {name:<11} {change:+.1f}% candles/s, RSS {before['peak_rss_mb']} → {r['peak_rss_mb']} MB")
+
+    RESULTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(RESULTS_FILE, "a") as f:
+        f.write(json.dumps({
+            "run_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "scale": scale,
+            "stages": results,
+        }) + "\n")
+    print(f"\n💾 Results appended to {RESULTS_FILE}")
+
+
+# ==== MAIN RUN ====
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--stage":
+        run_stage_child(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        main()
@@ -18,6 +18,7 @@ import streamlit as st
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import time
+from candle_store import CANDLE_STORE, CANDLES_TABLE
 
 # === Advanced Debugging Configuration ===
 def setup_advanced_debugging():
@@ -793,6 +794,16 @@ except Exception as e:
     """)
     st.stop()
 
+# === Candle source: per-pair table, or the unified candles table (CANDLE_STORE=unified) ===
+def candle_source(symbol_param, timeframe_param):
+    "FROM-clause source with datetime + OHLCV columns for one series, whichever store it lives in"
+    if CANDLE_STORE == "unified":
+        return f"""(
+            SELECT ts AS datetime, open, high, low, close, volume FROM public.{CANDLES_TABLE}
+            WHERE symbol = '{symbol_param.upper()}-USD' AND timeframe = '{timeframe_param}'
+        ) AS series"""
+    return f"public.{symbol_param.lower()}usd_{timeframe_param}"
+
 # === Enhanced data query function ===
 @st.cache_data(ttl=300)  # Cache for 5 minutes
 def load_crypto_data(symbol_param, start_date_param, end_date_param):
@@ -801,19 +812,11 @@ def load_crypto_data(symbol_param, start_date_param, end_date_param):
     # Performance timing
     start_time = time.time()
     
-    # Handle different table naming conventions
-    table_mapping = {
-        'BTC': 'btcusd_1d',
-        'ETH': 'ethusd_1d', 
-        'SOL': 'solusd_1d',
-        'TAO': 'taousd_1d'
-    }
-    
-    table_name = table_mapping.get(symbol_param, f"{symbol_param.lower()}usd_1d")
+    table_name = candle_source(symbol_param, '1d')
     
     query = f"""
         SELECT datetime, open, high, low, close, volume
-        FROM public.{table_name}
+        FROM {table_name}
         WHERE datetime BETWEEN '{start_date_param}' AND '{end_date_param}'
         ORDER BY datetime;
     """
@@ -0,0 +1,81 @@
+'''
+Shared candle decoder: Coinbase /candles response bytes → typed NumPy columns.
+
+Coinbase rows are [time, low, high, open, close, volume] (NOT OHLC order!). This is the
+only place that order is applied; everything downstream gets datetime + open/high/low/close/volume.
+
+    rows = decode_candles(response.content)   # float64 array, shape (n, 6), oldest first
+    df = candles_to_frame(rows)               # DataFrame indexed by datetime, OHLCV columns
+
+No Python list or float per value is created: NumPy parses the comma-separated body straight
+into a float64 buffer (np.fromstring with sep=','), and CandleColumns appends blocks into
+preallocated int64 / float64 arrays.
+'''
+
+# ===== Imports =====
+import numpy as np
+import pandas as pd
+
+# === Column layout ===
+COINBASE_COLUMNS = ['time', 'low', 'high', 'open', 'close', 'volume']  # order of /candles rows
+OHLCV = ['open', 'high', 'low', 'close', 'volume']
+OHLCV_INDEX = [COINBASE_COLUMNS.index(c) for c in OHLCV]  # → [3, 2, 1, 4, 5]
+EMPTY = np.empty((0, 6), dtype=np.float64)
+
+
+def decode_candles(body):
+    "Raw response bytes (or already-parsed rows) → (n, 6) float64 array sorted by time"
+    if isinstance(body, (bytes, bytearray)):
+        values = bytes(body).translate(None, b'[] \n\r\t')
+        if not values:
+            return EMPTY
+        rows = np.fromstring(values, dtype=np.float64, sep=',').reshape(-1, 6)  # parsed in C, no per-value objects
+    else:
+        rows = np.asarray(body, dtype=np.float64).reshape(-1, 6)
+    return rows[np.argsort(rows[:, 0], kind='stable')]  # Coinbase sends newest first
+
+
+class CandleColumns:
+    "Growable preallocated columns: int64 epoch seconds + float64 OHLCV"
+
+    def __init__(self, capacity=0):
+        self.size = 0
+        self.time = np.empty(capacity, dtype=np.int64)
+        self.ohlcv = np.empty((capacity, 5), dtype=np.float64)
+
+    def _reserve(self, needed):
+        if needed <= len(self.time):
+            return
+        capacity = max(needed, 2 * len(self.time), 1024)
+        time, ohlcv = self.time, self.ohlcv
+        self.time = np.empty(capacity, dtype=np.int64)
+        self.ohlcv = np.empty((capacity, 5), dtype=np.float64)
+        self.time[:self.size] = time[:self.size]
+        self.ohlcv[:self.size] = ohlcv[:self.size]
+
+    def append(self, rows):
+        "Append an (n, 6) block in Coinbase column order"
+        n = len(rows)
+        if not n:
+            return
+        self._reserve(self.size + n)
+        self.time[self.size:self.size + n] = rows[:, 0]
+        self.ohlcv[self.size:self.size + n] = rows[:, OHLCV_INDEX]
+        self.size += n
+
+    def to_frame(self):
+        "DataFrame indexed by datetime (sorted, duplicates dropped) with OHLCV columns"
+        time = self.time[:self.size]
+        ohlcv = self.ohlcv[:self.size]
+        if self.size and np.any(np.diff(time) <= 0):
+            time, keep = np.unique(time, return_index=True)
+            ohlcv = ohlcv[keep]
+        index = pd.DatetimeIndex(time.astype('datetime64[s]').astype('datetime64[ns]'), name='datetime')
+        return pd.DataFrame(ohlcv, index=index, columns=OHLCV)
+
+
+def candles_to_frame(rows):
+    "(n, 6) Coinbase-order block → DataFrame indexed by datetime with OHLCV columns"
+    columns = CandleColumns(len(rows))
+    columns.append(np.asarray(rows, dtype=np.float64).reshape(-1, 6))
+    return columns.to_frame()
@@ -0,0 +1,134 @@
+'''
+Sinks that persist candle batches as they are fetched, so a backfill never holds
+its whole history in memory.
+
+    CsvSink(path, resume)       → appends to path.partial, renamed to path on close()
+    PostgresRawSink(cur, table) → creates the (UNLOGGED) _raw table if needed, COPYs every batch in
+
+sink.sync_manifest(manifest, symbol, granularity, start_ts) lines a ChunkManifest up with what the sink
+holds before a backfill and returns where fetching should start: nothing to resume → forget old progress;
+a resumed CSV partial is cut back to the unbroken run of done windows (reading backwards from EOF, never
+loading it) and fetching carries on from its end, so appended rows neither repeat nor land out of order.
+A _raw table needs no cut — COPY skips duplicate candles.
+
+Both take the DataFrames the fetch scripts already build (datetime index + OHLCV columns).
+'''
+
+# ===== Imports =====
+import os
+from pathlib import Path
+import pandas as pd
+from db_utils import copy_candles, create_raw_table
+
+# === CONFIG ===
+TAIL_BYTES = 1 << 16  # block size when cutting a resumed partial back from EOF
+
+
+class CsvSink:
+    "Append batches to a temp file; only rename to the real name once the backfill finishes"
+
+    def __init__(self, output_file, resume=False):
+        self.output_file = Path(output_file)
+        self.partial_file = self.output_file.with_name(self.output_file.name + ".partial")
+        self.partial_file.parent.mkdir(parents=True, exist_ok=True)
+        self.destination = str(self.output_file)  # ChunkManifest key
+        self.rows = 0
+
+        # Keep a crashed run's rows when resuming, otherwise start clean
+        self.resumed = resume and self.partial_file.exists()
+        if self.resumed:
+            print(f"🔁 Resuming into {self.partial_file.name}")
+        elif self.partial_file.exists():
+            self.partial_file.unlink()
+
+    def write(self, df):
+        df.to_csv(self.partial_file, mode='a', header=not (self.rows or self.resumed))
+        self.rows += len(df)
+
+    def sync_manifest(self, manifest, symbol, granularity, start_ts):
+        "Returns where the backfill should start fetching: start_ts, or the end of the rows kept on resume"
+        if not self.resumed:
+            manifest.clear(symbol, granularity, self.destination)  # no partial file → nothing to resume from
+            return start_ts
+        run_end = manifest.trim(symbol, granularity, self.destination, start_ts)
+        dropped = self._truncate_from(run_end)
+        if dropped:
+            print(f"✂️  Dropped {dropped} rows past the last finished chunk (re-fetched next)")
+        return start_ts if run_end is None else max(start_ts, run_end)
+
+    def _truncate_from(self, cutoff_ts):
+        """Drop rows at or after cutoff_ts (all rows if None) from the sorted partial, reading backwards
+        from EOF a block at a time; a half-written last line goes too. Returns rows dropped."""
+        cutoff = None if cutoff_ts is None else pd.Timestamp(cutoff_ts, unit='s')
+        dropped, keep = 0, None
+        with open(self.partial_file, "r+b") as f:
+            position = end = f.seek(0, os.SEEK_END)
+            carry = b""
+            while position > 0 and keep is None:
+                step = min(TAIL_BYTES, position)
+                position -= step
+                f.seek(position)
+                block = f.read(step) + carry
+                lines = block.split(b"\n")
+                start = position
+                if position > 0:  # the block may start mid-line: finish that line with the next block
+                    carry = lines.pop(0)
+                    start += len(carry) + 1
+                starts = []
+                for line in lines:
+                    starts.append(start)
+                    start += len(line) + 1
+                for line, start in zip(reversed(lines), reversed(starts)):
+                    if not line.strip():
+                        continue
+                    if start + len(line) < end and self._keeps(line, cutoff):  # newline-terminated + kept
+                        keep = start + len(line) + 1
+                        break
+                    dropped += 1
+            f.truncate(keep or 0)
+        if not keep:  # not even a header left → start the file over
+            self.partial_file.unlink()
+            self.resumed = False
+        return dropped
+
+    @staticmethod
+    def _keeps(line, cutoff):
+        "Header, or a complete row older than cutoff"
+        if line.startswith(b"datetime"):
+            return True
+        try:
+            return cutoff is not None and pd.Timestamp(line.split(b",", 1)[0].decode()) < cutoff
+        except ValueError:
+            return False
+
+    def close(self):
+        if self.rows or self.resumed:
+            os.replace(self.partial_file, self.output_file)
+            print(f"📁 Data saved to {self.output_file} ({self.rows} rows)")
+        else:
+            print("⏸️  No candles fetched — nothing saved.")
+
+
+class PostgresRawSink:
+    "Bulk-load each batch straight into the {pair}_{tf}_raw table (COPY + ON CONFLICT DO NOTHING)"
+
+    def __init__(self, cur, raw_table):
+        self.cur = cur
+        self.raw_table = raw_table
+        self.destination = raw_table  # ChunkManifest key
+        self.rows = 0
+        # Rows left by an interrupted run → resume; empty (new, or wiped by crash recovery) → start clean
+        self.resumed = create_raw_table(cur, raw_table)
+
+    def write(self, df):
+        copy_candles(self.cur, self.raw_table, df)
+        self.rows += len(df)
+
+    def sync_manifest(self, manifest, symbol, granularity, start_ts):
+        "COPY skips candles already staged, so only a fresh table resets progress; fetching starts at start_ts"
+        if not self.resumed:
+            manifest.clear(symbol, granularity, self.destination)  # empty _raw table → nothing to resume from
+        return start_ts
+
+    def close(self):
+        print(f"✅ Inserted {self.rows} rows to {self.raw_table}")
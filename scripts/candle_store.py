@@ -0,0 +1,194 @@
+'''
+Unified candle table: one partitioned `candles` table for every pair and timeframe,
+instead of a btcusd_1m / btcusd_1m_raw / ... table per series.
+
+    candles (symbol, timeframe, ts, open, high, low, close, volume)
+      └─ PARTITION BY LIST (timeframe)   candles_1m, candles_5m, candles_1h, ...
+           └─ PARTITION BY RANGE (ts)    candles_1m_2025_06 (monthly), candles_1d_2025 (yearly)
+
+Queries that filter on timeframe + ts only touch the partitions they need (partition pruning),
+and adding a pair is just new rows — partitions are per time period, not per symbol.
+Writers call ensure_partitions() for the range they're about to load.
+
+Usage:
+    from candle_store import create_candles_table, load_candles, promote_raw_to_candles
+    create_candles_table(cur)
+    load_candles(cur, "BTC-USD", "1m", df_or_csv_path)
+
+Move the existing per-pair tables in with migrate_to_candles.py, then set CANDLE_STORE=unified
+in .env so orchestrator_db.py / get_new_rawdb_candles.py read and write `candles` instead.
+'''
+
+# ===== Imports =====
+import datetime
+import os
+from db_utils import CANDLE_COLUMNS, VALUE_TYPE, copy_candles, create_candle_table
+
+# === CONFIG ===
+CANDLE_STORE = os.getenv("CANDLE_STORE", "tables").lower()  # "tables" (per pair) or "unified"
+CANDLES_TABLE = "candles"
+TIMEFRAMES = ["1m", "5m", "15m", "1h", "6h", "1d"]
+MONTHLY_TIMEFRAMES = ["1m", "5m"]  # ~43k 1m rows per pair per month; coarser timeframes get yearly partitions
+QUOTES = ["USDC", "USDT", "USD", "EUR", "GBP", "BTC"]
+
+
+def symbol_from_pair(pair):
+    "BTCUSD → BTC-USD"
+    pair = pair.upper()
+    for quote in QUOTES:
+        if pair.endswith(quote) and len(pair) > len(quote):
+            return f"{pair[:-len(quote)]}-{quote}"
+    return f"{pair[:3]}-{pair[3:]}"
+
+
+def create_candles_table(cur):
+    "Create the parent table and one LIST partition (itself range-partitioned) per timeframe"
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CANDLES_TABLE} (
+            symbol TEXT NOT NULL,
+            timeframe TEXT NOT NULL,
+            ts TIMESTAMP NOT NULL,
+            open {VALUE_TYPE},
+            high {VALUE_TYPE},
+            low {VALUE_TYPE},
+            close {VALUE_TYPE},
+            volume {VALUE_TYPE},
+            PRIMARY KEY (symbol, timeframe, ts)
+        ) PARTITION BY LIST (timeframe);
+    """)
+    for timeframe in TIMEFRAMES:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CANDLES_TABLE}_{timeframe}
+            PARTITION OF {CANDLES_TABLE} FOR VALUES IN (%s)
+            PARTITION BY RANGE (ts);
+        """, (timeframe,))
+
+
+def _periods(timeframe, start, end):
+    "(name suffix, period start, period end) for every partition period touching [start, end]"
+    monthly = timeframe in MONTHLY_TIMEFRAMES
+    current = datetime.datetime(start.year, start.month if monthly else 1, 1)
+    while current <= end:
+        if monthly:
+            following = datetime.datetime(current.year + current.month // 12, current.month % 12 + 1, 1)
+            suffix = f"{current.year}_{current.month:02d}"
+        else:
+            following = datetime.datetime(current.year + 1, 1, 1)
+            suffix = f"{current.year}"
+        yield suffix, current, following
+        current = following
+
+
+def ensure_partitions(cur, timeframe, start, end):
+    """Create any missing range partitions covering [start, end] for a timeframe.
+    Orchestrator workers derive several pairs of one timeframe at once, so the DDL runs under a
+    transaction-level advisory lock per timeframe: a second session waits for the first one's commit,
+    then finds the partition already there instead of failing on a duplicate / overlapping one."""
+    if start is None or end is None:
+        return
+    parent = f"{CANDLES_TABLE}_{timeframe}"
+    periods = {f"{parent}_{suffix}": (lower, upper) for suffix, lower, upper in _periods(timeframe, start, end)}
+    cur.execute("SELECT name FROM unnest(%s::TEXT[]) AS name WHERE to_regclass(name) IS NULL;", (list(periods),))
+    missing = [name for (name,) in cur.fetchall()]
+    if not missing:
+        return  # the usual case: no lock taken
+    # One statement, so lock + DDL share a transaction even on an autocommit cursor
+    ddl = "".join(f"""
+            CREATE TABLE IF NOT EXISTS {name}
+            PARTITION OF {parent} FOR VALUES FROM ('{periods[name][0]:%Y-%m-%d}') TO ('{periods[name][1]:%Y-%m-%d}');"""
+                  for name in missing)
+    cur.execute(f"""
+        DO $$
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('{parent}'));{ddl}
+        END $$;
+    """)
+
+
+def latest_ts(cur, symbol, timeframe):
+    "Newest candle time stored for a series, or None"
+    cur.execute(f"SELECT MAX(ts) FROM {CANDLES_TABLE} WHERE symbol = %s AND timeframe = %s;",
+                (symbol, timeframe))
+    return cur.fetchone()[0]
+
+
+def insert_from_table(cur, symbol, timeframe, source_table, since=None, upsert=False, with_last_ts=False):
+    """INSERT ... SELECT rows of a legacy-schema table (datetime + OHLCV) into candles.
+    Only rows newer than `since` when given. Returns rows inserted (plus the newest ts with with_last_ts)."""
+    where = "WHERE datetime > %(since)s" if since is not None else ""
+    cur.execute(f"SELECT MIN(datetime), MAX(datetime) FROM {source_table} {where};", {"since": since})
+    first, last = cur.fetchone()
+    if first is None:
+        return (0, None) if with_last_ts else 0
+    ensure_partitions(cur, timeframe, first, last)
+
+    if upsert:
+        conflict = "DO UPDATE SET " + ", ".join(f"{c} = EXCLUDED.{c}" for c in CANDLE_COLUMNS[1:])
+    else:
+        conflict = "DO NOTHING"
+    cur.execute(f"""
+        WITH inserted AS (
+            INSERT INTO {CANDLES_TABLE} (symbol, timeframe, ts, open, high, low, close, volume)
+            SELECT %(symbol)s, %(timeframe)s, datetime, open, high, low, close, volume
+            FROM {source_table}
+            {where}
+            ON CONFLICT (symbol, timeframe, ts) {conflict}
+            RETURNING ts
+        )
+        SELECT COUNT(*), MAX(ts) FROM inserted;
+    """, {"symbol": symbol, "timeframe": timeframe, "since": since})
+    rows, last_ts = cur.fetchone()
+    return (rows, last_ts) if with_last_ts else rows
+
+
+def load_candles(cur, symbol, timeframe, source):
+    "Bulk load a DataFrame or candle CSV (see db_utils.copy_candles) into candles. Returns rows inserted."
+    stage = f"{symbol.replace('-', '').lower()}_{timeframe}_load"
+    cur.execute(f"DROP TABLE IF EXISTS {stage};")
+    create_candle_table(cur, f"pg_temp.{stage}")
+    copy_candles(cur, stage, source)
+    rows = insert_from_table(cur, symbol, timeframe, stage)
+    cur.execute(f"DROP TABLE {stage};")
+    return rows
+
+
+def promote_many_to_candles(cur, batches):
+    """Promote several raw tables with ONE set-based insert: batches = [(symbol, timeframe, raw_table, since), ...].
+    Truncates the raw tables afterwards; run inside transaction(cur) so it's a single commit.
+    Returns [(rows inserted, newest inserted ts), ...] in batch order."""
+    if not batches:
+        return []
+    params = [since if since is not None else "-infinity" for *_, since in batches]
+    cur.execute(" UNION ALL ".join(
+        f"SELECT {i}, MIN(datetime), MAX(datetime) FROM {raw} WHERE datetime > %s"
+        for i, (_, _, raw, _) in enumerate(batches)
+    ) + ";", params)
+    for i, first, last in cur.fetchall():
+        ensure_partitions(cur, batches[i][1], first, last)
+
+    sources = " UNION ALL ".join(
+        f"SELECT {i} AS batch, datetime, open, high, low, close, volume FROM {raw} WHERE datetime > %s"
+        for i, (_, _, raw, _) in enumerate(batches)
+    )
+    series = ", ".join(f"({i}, %s, %s)" for i in range(len(batches)))
+    cur.execute(f"""
+        WITH inserted AS (
+            INSERT INTO {CANDLES_TABLE} (symbol, timeframe, ts, open, high, low, close, volume)
+            SELECT s.symbol, s.timeframe, r.datetime, r.open, r.high, r.low, r.close, r.volume
+            FROM ({sources}) r
+            JOIN (VALUES {series}) AS s (batch, symbol, timeframe) ON s.batch = r.batch
+            ON CONFLICT (symbol, timeframe, ts) DO NOTHING
+            RETURNING symbol, timeframe, ts
+        )
+        SELECT symbol, timeframe, COUNT(*), MAX(ts) FROM inserted GROUP BY symbol, timeframe;
+    """, params + [v for symbol, timeframe, *_ in batches for v in (symbol, timeframe)])
+    results = {(symbol, timeframe): (rows, last_ts) for symbol, timeframe, rows, last_ts in cur.fetchall()}
+
+    cur.execute(f"TRUNCATE TABLE {', '.join(raw for _, _, raw, _ in batches)};")
+    return [results.get((symbol, timeframe), (0, None)) for symbol, timeframe, *_ in batches]
+
+
+def promote_raw_to_candles(cur, symbol, timeframe, raw_table, since, with_last_ts=False):
+    "candles counterpart of db_utils.promote_raw: append raw rows newer than `since`, then purge raw"
+    rows, last_ts = promote_many_to_candles(cur, [(symbol, timeframe, raw_table, since)])[0]
+    return (rows, last_ts) if with_last_ts else rows
@@ -1,43 +1,37 @@
 """
 This script checks the last timestamp in each historical data file
-and saves a JSON file so your main data fetcher knows where to resume. 
+and saves it (with the row count) to the ingest state file so your main data fetcher knows where to resume.
 Run anytime you want new data. 
 Assuming historical data is relatively up to date, this script can be run daily or weekly.
+
+Nothing is parsed: each file's sidecar (written with it, see historical_store.py) gives the last
+timestamp and row count; without a current sidecar the last CSV line is read backwards from EOF.
 """
 
-import pandas as pd
 from pathlib import Path
-import json
+from historical_store import find_historical, last_timestamp, list_series
+from ingest_state import FileIngestState
 
 # === Setup ===
 project_dir = Path(__file__).resolve().parent.parent   # 👈 up from /scripts
 historical_dir = project_dir / "data" / "historical"
-output_file = project_dir / "data" / "last_timestamps.json"   # 👈 inside /data
+state = FileIngestState()   # 👈 data/ingest_state.json
 
 print(f"📂 Checking historical data in: {historical_dir}")
-print(f"💾 Will save last timestamps to: {output_file}")
-
-# === Loop all historical CSVs ===
-last_timestamps = {}
+print(f"💾 Will save last timestamps to: {state.path}")
 
-for csv_file in historical_dir.glob("*.csv"):
+# === Loop all historical files (CSV or Parquet) ===
+for name in list_series(historical_dir):
+    hist_file = find_historical(name, historical_dir)  # PAIR-TIMEFRAME=historical-data.csv / .parquet
     try:
-        # Use new naming convention: PAIR+TIMEFRAME=historical-data.csv
-        name = csv_file.stem.split('=')[0]  # e.g., BTCUSD-1m
-        print(f"🔍 Checking {csv_file.name}  →  ID: {name}")
+        print(f"🔍 Checking {hist_file.name}  →  ID: {name}")
 
-        df = pd.read_csv(csv_file, index_col='datetime', parse_dates=True)
+        last_ts, rows, source = last_timestamp(hist_file)
+        print(f"⏳  Last timestamp: {last_ts}  ({rows if rows is not None else '?'} rows, from {source})")
 
-        last_ts = df.index.max()
-        print(f"⏳  Last timestamp: {last_ts}")
-
-        last_timestamps[name] = last_ts.isoformat()
+        state.set(name, last_ts, rows)  # "tail": the file changed since its sidecar, so the count is unknown (None)
 
     except Exception as e:
-        print(f"❌ Error reading {csv_file.name}: {e}")
-
-# === Save results ===
-with open(output_file, "w") as f:
-    json.dump(last_timestamps, f, indent=2)
+        print(f"❌ Error reading {hist_file.name}: {e}")
 
-print(f"\n✅ All last timestamps saved to: {output_file}")
+print(f"\n✅ All last timestamps saved to: {state.path}")
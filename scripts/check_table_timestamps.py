@@ -1,76 +1,151 @@
 """
-Get earliest and latest timestamps for ALL tables in coinbase_data DB.
+Get earliest and latest timestamps (and row counts) for ALL candle tables in coinbase_data DB.
+
+By default nothing is scanned, so the report comes back in well under a second:
+  - earliest / latest → index endpoints (MIN / MAX on the datetime primary key is one index probe each),
+    all tables in one round trip
+  - rows              → ingest_state.row_count (maintained on every insert), else pg_class.reltuples
+                        (planner estimate as of the last ANALYZE, marked with ~)
+
+    python scripts/check_table_timestamps.py           # catalog / index based
+    python scripts/check_table_timestamps.py --exact   # MIN / MAX / COUNT(*) per table, in parallel
+
+--exact runs on STATS_WORKERS pooled connections (default 4).
 """
 
 # ===== Imports =====
-import pandas as pd
-import psycopg2
-from dotenv import load_dotenv
 import os
-from pathlib import Path
-
-# === Load .env ===
-project_root = Path(__file__).resolve().parent.parent
-env_path = project_root / ".env"
-load_dotenv(env_path)
-
-# === Get DB credentials ===
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-
-# === Connect to Postgres ===
-try:
-    conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
-    print(f"✅ Connected to database {DB_NAME}")
-
-    cur = conn.cursor()
-
-    # === Get list of tables ===
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from candle_store import CANDLE_STORE, CANDLES_TABLE, TIMEFRAMES, symbol_from_pair
+from db_utils import close_pool, get_pool, pooled_cursor
+from ingest_state import STATE_TABLE
+
+# === Fix Windows Unicode encoding for emojis ===
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+# === CONFIG ===
+EXACT = "--exact" in sys.argv[1:]
+WORKERS = int(os.getenv("STATS_WORKERS", "4"))
+
+
+def candle_tables(cur):
+    "Per-pair candle tables and their _raw staging tables, with the planner's row estimate"
     cur.execute("""
-        SELECT table_name 
-        FROM information_schema.tables
-        WHERE table_schema = 'public'
-        ORDER BY table_name;
+        SELECT c.relname, c.reltuples::BIGINT
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind = 'r'
+          AND c.relname ~ '^[a-z0-9]+_[0-9]+[mhd](_raw)?$'
+        ORDER BY c.relname;
     """)
-    tables = [row[0] for row in cur.fetchall()]
+    return cur.fetchall()
+
+
+def ingest_states(cur):
+    "{(symbol, timeframe): (last_ts, row_count)} — empty if ingest_state hasn't been created yet"
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (STATE_TABLE,))
+    if not cur.fetchone()[0]:
+        return {}
+    cur.execute(f"SELECT symbol, timeframe, last_ts, row_count FROM {STATE_TABLE};")
+    return {(symbol, tf): (last_ts, row_count) for symbol, tf, last_ts, row_count in cur.fetchall()}
+
+
+def endpoints(cur, tables):
+    "{table: (earliest, latest)} from the primary key index, every table in one statement"
+    if not tables:
+        return {}
+    cur.execute(" UNION ALL ".join(
+        f"SELECT '{t}', (SELECT MIN(datetime) FROM {t}), (SELECT MAX(datetime) FROM {t})" for t in tables
+    ) + ";")
+    return {t: (earliest, latest) for t, earliest, latest in cur.fetchall()}
+
+
+def fast_report(cur):
+    tables = candle_tables(cur)
+    states = ingest_states(cur) if CANDLE_STORE != "unified" else {}
+    ends = endpoints(cur, [t for t, _ in tables])
 
     results = []
+    for table, estimate in tables:
+        earliest, latest = ends[table]
+        pair, timeframe = table.split('_')[:2]
+        state = None if table.endswith("_raw") else states.get((symbol_from_pair(pair), timeframe))
+        if state and state[1] is not None:
+            rows, source = state[1], "ingest_state"
+        elif estimate >= 0:
+            rows, source = f"~{estimate}", "reltuples"
+        else:
+            rows, source = None, "never analyzed"
+        results.append({'table': table, 'earliest': earliest, 'latest': latest, 'rows': rows, 'source': source})
+    return results + unified_fast_report(cur)
 
-    # === Loop through each table to get min/max datetime ===
-    for table in tables:
+
+def unified_fast_report(cur):
+    "One line per series in the candles table, from ingest_state + the (symbol, timeframe, ts) index"
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (CANDLES_TABLE,))
+    if CANDLE_STORE != "unified" or not cur.fetchone()[0]:
+        return []
+    results = []
+    for (symbol, timeframe), (last_ts, row_count) in sorted(ingest_states(cur).items()):
+        cur.execute(f"""
+            SELECT ts FROM {CANDLES_TABLE} WHERE symbol = %s AND timeframe = %s ORDER BY ts LIMIT 1;
+        """, (symbol, timeframe))
+        first = cur.fetchone()
+        results.append({'table': f"{CANDLES_TABLE} ({symbol} {timeframe})", 'earliest': first[0] if first else None,
+                        'latest': last_ts, 'rows': row_count, 'source': "ingest_state"})
+    return results
+
+
+def exact_stats(table):
+    with pooled_cursor() as cur:
+        cur.execute(f"SELECT MIN(datetime), MAX(datetime), COUNT(*) FROM {table};")
+        earliest, latest, rows = cur.fetchone()
+    return {'table': table, 'earliest': earliest, 'latest': latest, 'rows': rows, 'source': "exact"}
+
+
+def exact_unified_stats(timeframe):
+    "Exact numbers for every series of one timeframe partition of the candles table"
+    with pooled_cursor() as cur:
         cur.execute(f"""
-            SELECT 
-                MIN(datetime) AS earliest, 
-                MAX(datetime) AS latest,
-                COUNT(*) AS rows
-            FROM {table};
-        """)
-        data = cur.fetchone()
-        earliest, latest, rows = data
-        results.append({
-            'table': table,
-            'earliest': earliest,
-            'latest': latest,
-            'rows': rows
-        })
-
-    df = pd.DataFrame(results)
-    pd.set_option('display.max_rows', None)
-    print(df)
-
-except Exception as e:
-    print(f"❌ Error: {e}")
-
-finally:
-    if conn:
-        conn.close()
+            SELECT symbol, MIN(ts), MAX(ts), COUNT(*) FROM {CANDLES_TABLE}
+            WHERE timeframe = %s GROUP BY symbol ORDER BY symbol;
+        """, (timeframe,))
+        return [{'table': f"{CANDLES_TABLE} ({symbol} {timeframe})", 'earliest': earliest, 'latest': latest,
+                 'rows': rows, 'source': "exact"} for symbol, earliest, latest, rows in cur.fetchall()]
+
+
+def exact_report(cur):
+    tables = [t for t, _ in candle_tables(cur)]
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (CANDLES_TABLE,))
+    unified = cur.fetchone()[0]
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        results = list(executor.map(exact_stats, tables))
+        if unified:
+            results += [row for rows in executor.map(exact_unified_stats, TIMEFRAMES) for row in rows]
+    return results
+
+
+if __name__ == "__main__":
+    started = time.time()
+    try:
+        get_pool(WORKERS + 1)  # one connection per worker + the catalog cursor
+        with pooled_cursor() as cur:
+            print(f"✅ Connected to database {os.getenv('DB_NAME')}")
+            results = exact_report(cur) if EXACT else fast_report(cur)
+
+        df = pd.DataFrame(results)
+        pd.set_option('display.max_rows', None)
+        print(df)
+        print(f"⏱️ {'Exact' if EXACT else 'Catalog'} report in {time.time() - started:.2f}s")
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+
+    finally:
+        close_pool()
         print("🔑 DB connection closed.")
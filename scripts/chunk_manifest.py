@@ -0,0 +1,91 @@
+'''
+Crash-resumable backfills: a small SQLite manifest of chunk windows that are already
+persisted, per (symbol, granularity, destination). The destination is the sink's output file
+or _raw table, so a CSV backfill and a Postgres backfill of the same product never share progress.
+
+The fetcher marks a window done only after the sink has written its batch, so if a
+multi-hour backfill dies at 80%, the next run skips the finished windows and carries on.
+Chunk windows sit on a fixed 300-candle grid (see async_fetcher.chunk_windows), so they
+line up between runs even though "now - WEEKS" moves.
+
+File: data/chunk_manifest.sqlite (override with CHUNK_MANIFEST_PATH)
+'''
+
+# ===== Imports =====
+import os
+import sqlite3
+from pathlib import Path
+
+# === CONFIG ===
+project_root = Path(__file__).resolve().parent.parent
+MANIFEST_PATH = Path(os.getenv("CHUNK_MANIFEST_PATH", project_root / "data" / "chunk_manifest.sqlite"))
+
+
+class ChunkManifest:
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(completed_chunks);")]
+        if columns and "destination" not in columns:
+            # Old manifests can't tell which output a window went to — drop them rather than guess
+            self.conn.execute("DROP TABLE completed_chunks;")
+            print("🧹 Chunk manifest predates per-destination progress — starting it over")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS completed_chunks (
+                symbol TEXT NOT NULL,
+                granularity INTEGER NOT NULL,
+                destination TEXT NOT NULL,
+                window_start INTEGER NOT NULL,
+                window_end INTEGER NOT NULL,
+                completed_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (symbol, granularity, destination, window_start, window_end)
+            );
+        """)
+        self.conn.commit()
+
+    def done_windows(self, symbol, granularity, destination):
+        "Set of (start, end) windows already persisted to `destination`"
+        rows = self.conn.execute(
+            "SELECT window_start, window_end FROM completed_chunks"
+            " WHERE symbol = ? AND granularity = ? AND destination = ?;",
+            (symbol, granularity, destination),
+        )
+        return {(start, end) for start, end in rows}
+
+    def mark_done(self, symbol, granularity, destination, windows):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO completed_chunks (symbol, granularity, destination, window_start, window_end)"
+                " VALUES (?, ?, ?, ?, ?);",
+                [(symbol, granularity, destination, start, end) for start, end in windows],
+            )
+
+    def clear(self, symbol, granularity, destination):
+        "Forget progress for one backfill (after it finished, or when its output is gone)"
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM completed_chunks WHERE symbol = ? AND granularity = ? AND destination = ?;",
+                (symbol, granularity, destination),
+            )
+
+    def trim(self, symbol, granularity, destination, start_ts):
+        """Keep only the unbroken run of done windows starting at the oldest one (which must cover start_ts)
+        and forget the rest — windows after a failed one, which a resumed run would otherwise append
+        out of order. Returns where that run ends (epoch seconds), or None if nothing usable is done."""
+        run_end, later = None, []
+        for start, end in sorted(self.done_windows(symbol, granularity, destination)):
+            if (run_end is None and start <= start_ts) or (run_end is not None and not later and start == run_end):
+                run_end = end
+            else:
+                later.append((start, end))
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM completed_chunks WHERE symbol = ? AND granularity = ? AND destination = ?"
+                " AND window_start = ? AND window_end = ?;",
+                [(symbol, granularity, destination, start, end) for start, end in later],
+            )
+        return run_end
+
+    def close(self):
+        self.conn.close()
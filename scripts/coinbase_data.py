@@ -17,13 +17,19 @@ import os
 from dotenv import load_dotenv
 from math import ceil
 from pathlib import Path
-import requests
+from http_client import BASE_URL
+from retry_policy import get_with_retry
 import time
 import hmac
 import hashlib
 import base64
 import json
 from urllib.parse import urlencode
+from async_fetcher import iter_candle_batches
+from candle_decoder import candles_to_frame
+from chunk_manifest import ChunkManifest
+from listing_date import get_listing_date
+from candle_sinks import CsvSink
 
 # Get the project root directory (2 levels up from this file)
 project_root = Path(__file__).parent  # NOT .parent.parent
@@ -114,17 +120,17 @@ def get_historical_data(symbol, timeframe, weeks):
 
     if output_file.exists():
         print(f"📁 Found existing data file!")
-        return pd.read_csv(output_file)
+        return output_file
 
     try:
         # Test API connection (product details)
         print("🌐 Testing API connection...")
-        base_url = "https://api.exchange.coinbase.com"
+        base_url = BASE_URL  # COINBASE_BASE_URL in .env, defaults to the real API
         path = '/products/' + symbol
 
         # ⚡ For product details, you can sign (optional)
         headers = sign_request('GET', path)
-        response = requests.get(f"{base_url}{path}", headers=headers)
+        response = get_with_retry(f"{base_url}{path}", headers=headers)
 
         if response.status_code != 200:
             print(f"❌ Response Headers: {response.headers}")
@@ -144,6 +150,11 @@ def get_historical_data(symbol, timeframe, weeks):
         else:
             earliest_allowed = datetime.datetime(2015, 1, 1)
 
+        # === Skip empty pre-listing ranges (first real candle, cached per product) ===
+        listing_date = get_listing_date(symbol)
+        if listing_date and listing_date > earliest_allowed:
+            earliest_allowed = listing_date
+
         if start_time < earliest_allowed:
             print(f"⏳ Adjusting start_time from {start_time} to {earliest_allowed} for {timeframe} candles.")
             start_time = earliest_allowed
@@ -160,64 +171,22 @@ def get_historical_data(symbol, timeframe, weeks):
         start_ts = math.floor(start_time.timestamp() // granularity) * granularity
         end_ts = end_time.timestamp()
 
-        all_candles = []
-        current_start_ts = start_ts
-
-        while current_start_ts < end_ts:
-            current_end_ts = min(current_start_ts + chunk_seconds, end_ts)
-
-            start_dt = datetime.datetime.utcfromtimestamp(current_start_ts)
-            end_dt = datetime.datetime.utcfromtimestamp(current_end_ts)
-
-            print(f"📊 Fetching from {start_dt} to {end_dt}")
-
-            params = {
-                'start': start_dt.isoformat(),
-                'end': end_dt.isoformat(),
-                'granularity': str(granularity)
-            }
-
-            path = f"/products/{symbol}/candles"
-
-            # === ✅ Robust retry ===
-            success = False
-            for attempt in range(5):  # try up to 5 times
-                response = requests.get(f"{base_url}{path}", params=params)
-
-                if response.status_code == 200:
-                    candles = response.json()
-                    all_candles.extend(candles)
-                    success = True
-                    break
-
-                elif response.status_code in [500, 502, 503, 504]:
-                    wait_sec = 2 ** attempt  # exponential backoff
-                    print(f"⚠️  {response.status_code} error → retrying in {wait_sec} sec...")
-                    time.sleep(wait_sec)
-                else:
-                    print(f"❌ Response Headers: {response.headers}")
-                    print(f"❌ Response Body: {response.text}")
-                    raise Exception(f"API Error: {response.status_code} - {response.text}")
-
-            if not success:
-                print(f"⚠️  Giving up on chunk {start_dt} to {end_dt} after retries. Skipping.")
-                # Do NOT crash — just move to next chunk
-
-            current_start_ts = current_end_ts
-            time.sleep(0.5)  # gentle pacing
-
-        print(f"✨ Successfully fetched {len(all_candles)} candles!")
+        # === Stream chunks straight to disk (memory stays flat) ===
+        # The manifest remembers finished chunks, so a crashed run picks up where it stopped
+        manifest = ChunkManifest()
+        sink = CsvSink(output_file, resume=True)
+        start_ts = sink.sync_manifest(manifest, symbol, granularity, start_ts)  # resumed CSV → after its kept rows
 
-        # === To DataFrame ===
-        df = pd.DataFrame(all_candles)
-        df.columns = ['datetime', 'open', 'high', 'low', 'close', 'volume']
-        df['datetime'] = pd.to_datetime(df['datetime'], unit='s')
-        df = df.set_index('datetime').sort_index()
+        for batch in iter_candle_batches(symbol, granularity, start_ts, end_ts,
+                                         manifest=manifest, destination=sink.destination):
+            sink.write(candles_to_frame(batch))
+        sink.close()
+        manifest.clear(symbol, granularity, sink.destination)  # finished → next run starts fresh
+        manifest.close()
 
-        df.to_csv(output_file)
-        print(f"📁 Data saved to {output_file}")
+        print(f"✨ Successfully fetched {sink.rows} candles!")
 
-        return df
+        return output_file
 
     except Exception as e:
         print(f"❌ Error: {str(e)}")
@@ -17,7 +17,8 @@ import os
 from dotenv import load_dotenv
 from math import ceil
 from pathlib import Path
-import requests
+from http_client import BASE_URL
+from retry_policy import get_with_retry
 import time
 import hmac
 import hashlib
@@ -25,7 +26,11 @@ import base64
 import json
 from urllib.parse import urlencode
 import psycopg2
-from psycopg2.extras import execute_values
+from async_fetcher import iter_candle_batches
+from candle_decoder import candles_to_frame
+from chunk_manifest import ChunkManifest
+from listing_date import get_listing_date
+from candle_sinks import CsvSink, PostgresRawSink
 
 # === Get project root ===
 project_root = Path(__file__).resolve().parent.parent  # 👈 from /scripts up to root
@@ -43,6 +48,7 @@ load_dotenv(env_path)
 api_key = os.getenv('COINBASE_API_KEY')
 api_secret = os.getenv('COINBASE_API_SECRET')
 SAVE_TO_POSTGRES = os.getenv("SAVE_TO_POSTGRES", "False").lower() == "true"
+RESET_MANIFEST = os.getenv("RESET_MANIFEST", "False").lower() == "true"  # ignore progress from a crashed run
 
 DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
@@ -108,13 +114,13 @@ def get_historical_data(symbol, timeframe, weeks):
 
     if output_file.exists() and not SAVE_TO_POSTGRES:
         print(f"📁 Found existing data file!")
-        return pd.read_csv(output_file)
+        return output_file
 
     try:
-        base_url = "https://api.exchange.coinbase.com"
+        base_url = BASE_URL  # COINBASE_BASE_URL in .env, defaults to the real API
         path = '/products/' + symbol
         headers = sign_request('GET', path)
-        response = requests.get(f"{base_url}{path}", headers=headers)
+        response = get_with_retry(f"{base_url}{path}", headers=headers)
 
         if response.status_code != 200:
             raise Exception(f"API Error: {response.status_code} - {response.text}")
@@ -132,6 +138,11 @@ def get_historical_data(symbol, timeframe, weeks):
         else:
             earliest_allowed = datetime.datetime(2015, 1, 1)
 
+        # === Skip empty pre-listing ranges (first real candle, cached per product) ===
+        listing_date = get_listing_date(symbol)
+        if listing_date and listing_date > earliest_allowed:
+            earliest_allowed = listing_date
+
         if start_time < earliest_allowed:
             print(f"⏳ Adjusting start_time from {start_time} to {earliest_allowed} for {timeframe} candles.")
             start_time = earliest_allowed
@@ -143,91 +154,30 @@ def get_historical_data(symbol, timeframe, weeks):
         start_ts = int(start_time.timestamp())
         end_ts = int(end_time.timestamp())
 
-        all_candles = []
-        current_start_ts = start_ts
-
-        while current_start_ts < end_ts:
-            current_end_ts = min(current_start_ts + chunk_seconds, end_ts)
-            start_dt = datetime.datetime.utcfromtimestamp(current_start_ts)
-            end_dt = datetime.datetime.utcfromtimestamp(current_end_ts)
-
-            print(f"📊 Fetching from {start_dt} to {end_dt}")
-
-            params = {
-                'start': start_dt.isoformat(),
-                'end': end_dt.isoformat(),
-                'granularity': str(granularity)
-            }
-
-            path = f"/products/{symbol}/candles"
-            success = False
-            for attempt in range(5):
-                response = requests.get(f"{base_url}{path}", params=params)
-                if response.status_code == 200:
-                    candles = response.json()
-                    all_candles.extend(candles)
-                    success = True
-                    break
-                elif response.status_code in [500, 502, 503, 504]:
-                    wait_sec = 2 ** attempt
-                    print(f"⚠️ {response.status_code} error → retrying in {wait_sec} sec...")
-                    time.sleep(wait_sec)
-                else:
-                    raise Exception(f"API Error: {response.status_code} - {response.text}")
-
-            if not success:
-                print(f"⚠️ Giving up on chunk {start_dt} to {end_dt} after retries.")
-
-            current_start_ts = current_end_ts
-            time.sleep(0.5)
-
-        print(f"✨ Successfully fetched {len(all_candles)} candles!")
-
-        df = pd.DataFrame(all_candles)
-        df.columns = ['datetime', 'open', 'high', 'low', 'close', 'volume']
-        df['datetime'] = pd.to_datetime(df['datetime'], unit='s')
-        df = df.set_index('datetime').sort_index()
+        # === Stream chunks straight to the sink (memory stays flat) ===
+        # The manifest remembers finished chunks, so a crashed run picks up where it stopped
+        manifest = ChunkManifest()
 
         if SAVE_TO_POSTGRES:
-            # ✅ Convert datetime64 to Python datetime before inserting into Postgres
-            df_reset = df.reset_index()
-            df_reset['datetime'] = pd.to_datetime(df_reset['datetime']).dt.to_pydatetime()
-
-            # Create table name
             pair, timeframe_clean = symbol.replace('-', ''), timeframe
             raw_table = f"{pair.lower()}_{timeframe_clean}_raw"
+            sink = PostgresRawSink(cur, raw_table)
+        else:
+            sink = CsvSink(output_file, resume=True)
+        if RESET_MANIFEST:
+            manifest.clear(symbol, granularity, sink.destination)
+        start_ts = sink.sync_manifest(manifest, symbol, granularity, start_ts)  # resumed CSV → after its kept rows
 
-            # Create table if not exists
-            cur.execute(f"""
-            CREATE TABLE IF NOT EXISTS {raw_table} (
-                datetime TIMESTAMP PRIMARY KEY,
-                open NUMERIC,
-                high NUMERIC,
-                low NUMERIC,
-                close NUMERIC,
-                volume NUMERIC
-            );
-            """)
-
-            # Insert rows
-            rows = [tuple(r) for r in df_reset.to_numpy()]
-
-            execute_values(
-                cur,
-                f"""
-                INSERT INTO {raw_table} (datetime, open, high, low, close, volume)
-                VALUES %s
-                ON CONFLICT (datetime) DO NOTHING;
-                """,
-                rows
-            )
-            print(f"✅ Inserted {len(rows)} rows to {raw_table}")
+        for batch in iter_candle_batches(symbol, granularity, start_ts, end_ts,
+                                         manifest=manifest, destination=sink.destination):
+            sink.write(candles_to_frame(batch))
+        sink.close()
+        manifest.clear(symbol, granularity, sink.destination)  # finished → next run starts fresh
+        manifest.close()
 
-        else:
-            df.to_csv(output_file)
-            print(f"📁 Data saved to {output_file}")
+        print(f"✨ Successfully fetched {sink.rows} candles!")
 
-        return df
+        return raw_table if SAVE_TO_POSTGRES else output_file
 
     except Exception as e:
         print(f"❌ Error: {str(e)}")
@@ -1,19 +1,24 @@
 '''
-This script fetches data based on last timestamps. It first reads the last timestamps from a JSON file,
+This script fetches data based on last timestamps. It first reads the last timestamps from the
+ingest state file (data/ingest_state.json, see ingest_state.py),
 then fetches new data from Coinbase for each pair and timeframe, then saves it to a "new-data.csv",
 which is saved to the following directory to be appended later:
 "SAVE_DIR = project_root / "data" / "append""
 
+Each saved file advances its series' watermark (last_ts) in the state file right away, so a crash
+mid-run only re-fetches the series that hadn't been saved yet. row_count is left to merge_append.py,
+which adds the rows once they're actually in the historical file.
+
 '''
 
-import pandas as pd
 import datetime
 import os
-import time
-import json
 from pathlib import Path
 from dotenv import load_dotenv
-import requests
+from http_client import BASE_URL
+from retry_policy import get_with_retry
+from candle_decoder import CandleColumns, decode_candles
+from ingest_state import FileIngestState
 import math
 
 # === CONFIG ===
@@ -25,10 +30,9 @@ project_root = Path(__file__).resolve().parent.parent  # <-- up from /scripts to
 
 env_path = project_root / ".env"
 
-# === JSON path (inside /data)
-LAST_TS_FILE = project_root / "data" / (
-    "last_timestamps_TEST.json" if TEST_MODE else "last_timestamps.json"
-)
+# === State file (inside /data)
+STATE_FILE = project_root / "data" / ("ingest_state_TEST.json" if TEST_MODE else "ingest_state.json")
+LEGACY_FILE = project_root / "data" / ("last_timestamps_TEST.json" if TEST_MODE else "last_timestamps.json")
 
 # === SAVE DIR (inside /data)
 if TEST_MODE:
@@ -36,7 +40,7 @@ if TEST_MODE:
 else:
     SAVE_DIR = project_root / "data" / "append"
 
-print(f"Resolved LAST_TS_FILE: {LAST_TS_FILE}")
+print(f"Resolved STATE_FILE: {STATE_FILE}")
 print(f"Resolved SAVE_DIR: {SAVE_DIR}")
 os.makedirs(SAVE_DIR, exist_ok=True)
 
@@ -55,26 +59,24 @@ def timeframe_to_granularity(timeframe):
         return int(''.join(c for c in timeframe if c.isdigit())) * 86400
 
 # === Load last timestamps ===
-if LAST_TS_FILE.exists():
-    with open(LAST_TS_FILE, "r") as f:
-        json_data = json.load(f)
-else:
-    json_data = {}
+state = FileIngestState(STATE_FILE, LEGACY_FILE)
 
 # === PROCESS ===
-for id in json_data.keys():
+for id in list(state.series):
     pair, timeframe = id.split("-")
-    symbol = f"{pair[:3]}-{pair[3:].strip()}"  # fix accidental space
+    symbol = f"{pair[:3]}-{pair[3:]}"
 
     # === New clean save target ===
-    save_file = SAVE_DIR / f"{id.strip()}=new-data.csv"
+    save_file = SAVE_DIR / f"{id}=new-data.csv"
 
     print(f"\n🚀 Processing {symbol} [{timeframe.strip()}]")
     print(f"💾 Target save: {save_file}")
 
     # === Figure out starting timestamp ===
-    json_last = json_data.get(id).strip()
-    best_last = pd.to_datetime(json_last)
+    best_last = state.last_ts(id)
+    if best_last is None:
+        print(f"⚠️ No watermark for {id} — run check_last_timestamp.py first. Skipping.")
+        continue
 
     print(f"✅ Using last timestamp: {best_last}")
 
@@ -95,12 +97,12 @@ for id in json_data.keys():
     print(f"⏰ Start: {start_time} | End: {end_time} | Granularity: {granularity}s")
 
     # === Fetch ===
-    base_url = "https://api.exchange.coinbase.com"
+    base_url = BASE_URL  # COINBASE_BASE_URL in .env, defaults to the real API
     path = f"/products/{symbol}/candles"
     max_candles = 300
     chunk_seconds = max_candles * granularity
 
-    all_candles = []
+    all_candles = CandleColumns()
     current_ts = math.floor(start_time.timestamp() // granularity) * granularity
     end_ts = end_time.timestamp()
 
@@ -116,56 +118,28 @@ for id in json_data.keys():
             "granularity": str(granularity)
         }
 
-        for attempt in range(5):
-            resp = requests.get(base_url + path, params=params)
-            if resp.status_code == 200:
-                all_candles.extend(resp.json())
-                break
-            elif resp.status_code in [500, 502, 503]:
-                wait = 2 ** attempt
-                print(f"⚠️  {resp.status_code} → retry in {wait}s")
-                time.sleep(wait)
-            else:
-                print(f"❌ {resp.status_code}: {resp.text}")
-                raise Exception("API error")
+        resp = get_with_retry(base_url + path, params=params)  # paced, retries 429 / 5xx
+        if resp.status_code == 200:
+            all_candles.append(decode_candles(resp.content))
+        else:
+            print(f"❌ {resp.status_code}: {resp.text}")
+            state.record_run(id, "error", f"HTTP {resp.status_code}")
+            raise Exception("API error")
 
         current_ts = chunk_end_ts
-        time.sleep(0.5)
 
-    print(f"✨ New candles fetched: {len(all_candles)}")
+    print(f"✨ New candles fetched: {all_candles.size}")
 
-    # === Save only new chunk ===
-    if all_candles:
-        new_df = pd.DataFrame(all_candles)
-        new_df.columns = ["datetime", "open", "high", "low", "close", "volume"]
-        new_df["datetime"] = pd.to_datetime(new_df["datetime"], unit="s")
-        new_df = new_df.set_index("datetime").sort_index()
+    # === Save only new chunk, then advance the watermark ===
+    if all_candles.size:
+        new_df = all_candles.to_frame()
         new_df.to_csv(save_file)
         print(f"✅ NEW chunk saved: {save_file}")
-    else:
-        print(f"⏸️  No new candles to save.")
 
-    # === Update JSON ===
-    new_latest = new_df.index.max().isoformat() if not new_df.empty else best_last.isoformat()
-    
-    if all_candles:
-        # build new_df, save it, get max timestamp
-        new_df = pd.DataFrame(all_candles)
-        new_df.columns = ["datetime", "open", "high", "low", "close", "volume"]
-        new_df["datetime"] = pd.to_datetime(new_df["datetime"], unit="s")
-        new_df = new_df.set_index("datetime").sort_index()
-        new_df.to_csv(save_file)
-        print(f"✅ NEW chunk saved: {save_file}")
-
-        new_latest = new_df.index.max().isoformat()
-        json_data[id] = new_latest
-        print(f"✅ Updated state: {new_latest}")
+        state.record_insert(id, 0, new_df.index.max().to_pydatetime())  # rows counted on merge
+        print(f"✅ Updated state: {state.last_ts(id)}")
     else:
+        state.record_run(id, "ok")
         print(f"⏸️  No new candles to save.")
-    
-
-# === Write updated JSON ===
-with open(LAST_TS_FILE, "w") as f:
-    json.dump(json_data, f, indent=2)
 
 print(f"\n🎉 ALL DONE. TEST_MODE = {TEST_MODE} → new chunks in: {SAVE_DIR}")
@@ -12,6 +12,7 @@ import psycopg2
 from dotenv import load_dotenv
 import os
 from pathlib import Path
+from ingest_state import reset_state
 
 # === Load .env ===
 project_root = Path(__file__).resolve().parent.parent
@@ -45,6 +46,7 @@ try:
     """
     cur.execute(create_table_query)
     print("✅ Created table taousd_1m from taousd_1m_raw")
+    reset_state(cur, "TAO-USD", "1m")  # next get_state() seeds the watermark from the new table
 
     # === Step 2. Add PRIMARY KEY constraint on datetime if possible ===
     try:
@@ -20,6 +20,7 @@ import streamlit as st
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import time
+from candle_store import CANDLE_STORE, CANDLES_TABLE
 
 # === Advanced Debugging Configuration ===
 def setup_advanced_debugging():
@@ -823,6 +824,16 @@ except Exception as e:
     """)
     st.stop()
 
+# === Candle source: per-pair table, or the unified candles table (CANDLE_STORE=unified) ===
+def candle_source(symbol_param, timeframe_param):
+    "FROM-clause source with datetime + OHLCV columns for one series, whichever store it lives in"
+    if CANDLE_STORE == "unified":
+        return f"""(
+            SELECT ts AS datetime, open, high, low, close, volume FROM public.{CANDLES_TABLE}
+            WHERE symbol = '{symbol_param.upper()}-USD' AND timeframe = '{timeframe_param}'
+        ) AS series"""
+    return f"public.{symbol_param.lower()}usd_{timeframe_param}"
+
 # === Enhanced data query function ===
 @st.cache_data(ttl=300)  # Cache for 5 minutes
 def load_crypto_data(symbol_param, start_date_param, end_date_param, timeframe_param='1d'):
@@ -833,7 +844,7 @@ def load_crypto_data(symbol_param, start_date_param, end_date_param, timeframe_p
 
     # Handle weekly aggregation by using daily data
     if timeframe_param == '1w':
-        table_name = f"{symbol_param.lower()}usd_1d"
+        table_name = candle_source(symbol_param, '1d')
         query = f"""
             SELECT
                 DATE_TRUNC('week', datetime) as datetime,
@@ -843,16 +854,16 @@ def load_crypto_data(symbol_param, start_date_param, end_date_param, timeframe_p
                 LAST_VALUE(close) OVER (PARTITION BY DATE_TRUNC('week', datetime) ORDER BY datetime
                     ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) as close,
                 SUM(volume) OVER (PARTITION BY DATE_TRUNC('week', datetime)) as volume
-            FROM public.{table_name}
+            FROM {table_name}
             WHERE datetime BETWEEN '{start_date_param}' AND '{end_date_param}'
             ORDER BY datetime;
         """
     else:
         # Regular timeframes
-        table_name = f"{symbol_param.lower()}usd_{timeframe_param}"
+        table_name = candle_source(symbol_param, timeframe_param)
         query = f"""
             SELECT datetime, open, high, low, close, volume
-            FROM public.{table_name}
+            FROM {table_name}
             WHERE datetime BETWEEN '{start_date_param}' AND '{end_date_param}'
             ORDER BY datetime;
         """
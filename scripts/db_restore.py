@@ -2,12 +2,16 @@
 db_restore.py
 
 Restores your Postgres DB from a backup SQL file.
+Afterwards every ingest_state row is cleared, so the pipelines re-seed their watermarks
+from the restored tables instead of trusting whatever the dump carried.
 """
 
 import os
 import subprocess
 from pathlib import Path
 from dotenv import load_dotenv
+import psycopg2
+from ingest_state import reset_state
 
 # === Load .env ===
 project_root = Path(__file__).resolve().parent.parent
@@ -72,6 +76,14 @@ subprocess.run([
     "-f", str(latest)
 ], check=True)
 
+# === Watermarks follow the restored tables ===
+conn = psycopg2.connect(dbname=restore_db, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+conn.autocommit = True
+with conn.cursor() as cur:
+    reset_state(cur)
+conn.close()
+print("🧭 ingest_state cleared — watermarks re-seed from the restored tables")
+
 print("✅ Restore complete!")
 
 # Clean env
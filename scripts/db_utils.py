@@ -0,0 +1,206 @@
+'''
+Small shared Postgres helpers for the candle pipeline scripts.
+
+    connect()                          → psycopg2 connection from the DB_* settings in .env
+    pooled_cursor()                    → cursor on a connection borrowed from the shared pool
+    transaction(cur)                   → BEGIN / COMMIT (ROLLBACK on error) on an autocommit connection
+    create_candle_table(cur, table)    → CREATE TABLE IF NOT EXISTS with the standard schema
+    create_raw_table(cur, table)       → the same as an UNLOGGED _raw staging table (no WAL)
+    promote_raw(cur, hist, raw, since) → copy new rows from {pair}_{tf}_raw into history, then truncate raw
+    promote_many(cur, batches)         → the same for many raw tables in one statement (all pairs, one commit)
+    copy_candles(cur, table, source)   → bulk load a DataFrame or CSV file via COPY + one upsert
+
+Candle values are NUMERIC by default. CANDLE_VALUE_TYPE=double stores them as DOUBLE PRECISION
+instead (fixed 8 bytes, much faster to aggregate, reads back as float64 instead of Decimal);
+migrate_value_type.py converts existing tables in place.
+'''
+
+# ===== Imports =====
+import contextlib
+import io
+import os
+import threading
+from pathlib import Path
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2.pool import ThreadedConnectionPool
+
+# === Load .env ===
+project_root = Path(__file__).resolve().parent.parent
+load_dotenv(project_root / ".env")
+
+# === CONFIG ===
+VALUE_TYPES = {"numeric": "NUMERIC", "double": "DOUBLE PRECISION"}
+VALUE_TYPE = VALUE_TYPES[os.getenv("CANDLE_VALUE_TYPE", "numeric").lower()]
+VALUE_TYPE_NAMES = ["numeric", "double precision"]  # information_schema.columns.data_type spellings
+
+
+def _db_settings():
+    return dict(
+        dbname=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT")
+    )
+
+
+def connect(autocommit=True):
+    conn = psycopg2.connect(**_db_settings())
+    conn.autocommit = autocommit
+    return conn
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(max_connections=None):
+    "Process-wide connection pool (DB_POOL_SIZE connections at most)"
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            max_connections = max_connections or int(os.getenv("DB_POOL_SIZE", "8"))
+            _pool = ThreadedConnectionPool(1, max_connections, **_db_settings())
+        return _pool
+
+
+@contextlib.contextmanager
+def pooled_cursor():
+    "Autocommit cursor on a pooled connection; the connection goes back to the pool afterwards"
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            yield cur
+    finally:
+        pool.putconn(conn, close=conn.closed != 0)
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def create_candle_table(cur, table_name, unlogged=False):
+    cur.execute(f"""
+        CREATE {"UNLOGGED " if unlogged else ""}TABLE IF NOT EXISTS {table_name} (
+            datetime TIMESTAMP PRIMARY KEY,
+            open {VALUE_TYPE},
+            high {VALUE_TYPE},
+            low {VALUE_TYPE},
+            close {VALUE_TYPE},
+            volume {VALUE_TYPE}
+        );
+    """)
+
+
+def create_raw_table(cur, table_name):
+    """{pair}_{tf}_raw staging table, UNLOGGED: staging writes skip WAL, only the promotion into
+    history is logged. Postgres empties unlogged tables during crash recovery, which is fine for
+    staging — the next run re-fetches from the ingest_state watermark. Existing logged _raw tables
+    are switched over once. Returns True if the table already held rows (a run to resume)."""
+    cur.execute("SELECT relpersistence FROM pg_class WHERE oid = to_regclass(%s);", (table_name,))
+    row = cur.fetchone()
+    if row is None:
+        create_candle_table(cur, table_name, unlogged=True)
+        return False
+    if row[0] == 'p':
+        cur.execute(f"ALTER TABLE {table_name} SET UNLOGGED;")
+        print(f"🔧 {table_name} switched to UNLOGGED")
+    cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name});")
+    return cur.fetchone()[0]
+
+
+@contextlib.contextmanager
+def transaction(cur):
+    "Group statements on an autocommit cursor into one transaction"
+    cur.execute("BEGIN;")
+    try:
+        yield cur
+    except BaseException:
+        cur.execute("ROLLBACK;")
+        raise
+    cur.execute("COMMIT;")
+
+
+def promote_many(cur, batches):
+    """Promote several raw tables at once: batches = [(historical_table, raw_table, since), ...].
+    One statement (a data-modifying CTE per table), one TRUNCATE, so run inside transaction(cur)
+    and every series lands in the same commit. Returns [(rows inserted, newest inserted datetime), ...]."""
+    if not batches:
+        return []
+    ctes = ",\n".join(f"""
+        ins{i} AS (
+            INSERT INTO {hist} (datetime, open, high, low, close, volume)
+            SELECT datetime, open, high, low, close, volume
+            FROM {raw}
+            WHERE datetime > %s
+            ON CONFLICT (datetime) DO NOTHING
+            RETURNING datetime
+        )""" for i, (hist, raw, _) in enumerate(batches))
+    totals = " UNION ALL ".join(f"SELECT {i}, COUNT(*), MAX(datetime) FROM ins{i}" for i in range(len(batches)))
+    cur.execute(f"WITH {ctes}\n{totals};", [since if since is not None else "-infinity" for _, _, since in batches])
+    results = {i: (rows, last_ts) for i, rows, last_ts in cur.fetchall()}
+
+    cur.execute(f"TRUNCATE TABLE {', '.join(raw for _, raw, _ in batches)};")
+    return [results[i] for i in range(len(batches))]
+
+
+def promote_raw(cur, historical_table, raw_table, since, with_last_ts=False):
+    """Append raw rows newer than `since` to the historical table, then purge raw. Returns rows inserted
+    (or (rows inserted, newest inserted datetime) with with_last_ts=True, for ingest_state)."""
+    rows_inserted, last_ts = promote_many(cur, [(historical_table, raw_table, since)])[0]
+    return (rows_inserted, last_ts) if with_last_ts else rows_inserted
+
+
+CANDLE_COLUMNS = ['datetime', 'open', 'high', 'low', 'close', 'volume']
+COPY_BUFFER_SIZE = 1 << 20  # bytes per COPY round trip when streaming files
+
+
+def _csv_columns(path):
+    with open(path, "r") as f:
+        return [c.strip() for c in f.readline().split(",")]
+
+
+def copy_candles(cur, table, source, upsert=False):
+    """Bulk load candles into `table`: COPY FROM STDIN into a session temp table, then a
+    single INSERT ... SELECT ... ON CONFLICT. Returns rows inserted (or updated).
+
+    source is a DataFrame (datetime index or column + OHLCV) or the path of a candle CSV
+    with a header row, which is streamed to the server without being parsed in Python.
+    upsert=True overwrites existing candles instead of keeping them."""
+    stage = f"{table}_copy_stage"
+    cur.execute(f"DROP TABLE IF EXISTS {stage};")
+    cur.execute(f"CREATE TEMP TABLE {stage} (LIKE {table});")  # same column types, no PK to slow COPY
+
+    if hasattr(source, "to_csv"):
+        df = source.reset_index() if "datetime" not in source.columns else source
+        buffer = io.StringIO()
+        df[CANDLE_COLUMNS].to_csv(buffer, index=False, header=False, date_format="%Y-%m-%d %H:%M:%S")
+        buffer.seek(0)
+        cur.copy_expert(f"COPY {stage} ({', '.join(CANDLE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    else:
+        columns = _csv_columns(source)
+        with open(source, "r") as f:
+            cur.copy_expert(f"COPY {stage} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+                            f, size=COPY_BUFFER_SIZE)
+
+    if upsert:
+        conflict = "DO UPDATE SET " + ", ".join(f"{c} = EXCLUDED.{c}" for c in CANDLE_COLUMNS[1:])
+        select = f"SELECT DISTINCT ON (datetime) {', '.join(CANDLE_COLUMNS)} FROM {stage} ORDER BY datetime"
+    else:
+        conflict = "DO NOTHING"
+        select = f"SELECT {', '.join(CANDLE_COLUMNS)} FROM {stage}"
+    cur.execute(f"""
+        INSERT INTO {table} ({', '.join(CANDLE_COLUMNS)})
+        {select}
+        ON CONFLICT (datetime) {conflict};
+    """)
+    rows_inserted = cur.rowcount
+    cur.execute(f"DROP TABLE {stage};")
+    return rows_inserted
@@ -0,0 +1,271 @@
+'''
+Local stand-in for the public Coinbase Exchange candles API, for offline testing and
+benchmarking of the fetch scripts.
+
+Implements:
+    GET /products/{id}           → product details
+    GET /products/{id}/candles   → [[time, low, high, open, close, volume], ...] newest first,
+                                   max 300 candles per request (400 otherwise), like the real API
+
+Prices are a deterministic synthetic series per product (same timestamp → same candle on
+every run), built from 1m candles so 5m/1h/6h/1d candles aggregate consistently.
+Each product has a listing date, and a small share of minutes have no trades (no candle).
+
+Run it:
+    python scripts/fake_coinbase_server.py
+    COINBASE_BASE_URL="http://127.0.0.1:8765" python scripts/coinbase_data.py
+
+Knobs (env vars):
+    FAKE_PORT=8765            FAKE_LATENCY_MS=0        FAKE_JITTER_MS=0
+    FAKE_ERROR_RATE_429=0.0   FAKE_ERROR_RATE_5XX=0.0  FAKE_RATE_LIMIT=0 (req/s, 0 = off)
+    FAKE_GAP_RATE=0.001       FAKE_SEED=42
+
+From Python (tests / benchmarks):
+    from fake_coinbase_server import start_server
+    server, base_url = start_server(port=0, latency_ms=50)
+    ...
+    server.shutdown()
+'''
+
+# ===== Imports =====
+import datetime
+import gzip
+import json
+import os
+import random
+import threading
+import time
+import zlib
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# === CONFIG ===
+MAX_CANDLES = 300
+GRANULARITIES = [60, 300, 900, 3600, 21600, 86400]
+DEFAULT_LISTING = "2016-01-01"
+LISTINGS = {
+    "BTC-USD": "2015-01-01",
+    "ETH-USD": "2016-05-18",
+    "SOL-USD": "2021-06-17",
+    "WIF-USD": "2024-03-14",
+    "TAO-USD": "2025-04-10",
+}
+
+
+def _epoch(value):
+    "Coinbase accepts ISO 8601 or epoch seconds"
+    if value.isdigit():
+        return int(value)
+    dt = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int(dt.timestamp())
+
+
+def listing_ts(product_id):
+    day = datetime.date.fromisoformat(LISTINGS.get(product_id, DEFAULT_LISTING))
+    return int(datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc).timestamp())
+
+
+def _hash01(t, salt):
+    "Deterministic pseudo-random in [0, 1) per timestamp"
+    x = (t.astype(np.uint64) * np.uint64(2654435761) + np.uint64(salt)) % np.uint64(1000003)
+    return x.astype(np.float64) / 1000003.0
+
+
+def minute_candles(product_id, start, end, gap_rate):
+    "1m candles (time, low, high, open, close, volume arrays) for [start, end), minute aligned"
+    seed = zlib.crc32(product_id.encode())
+    t = np.arange(max(start, listing_ts(product_id)), end, 60, dtype=np.int64)
+    if gap_rate:
+        t = t[_hash01(t, seed + 7) >= gap_rate]  # minutes with no trades
+
+    base = 5 + seed % 50000
+
+    def price(ts):
+        wobble = _hash01(ts, seed) - 0.5
+        return base * (1 + 0.3 * np.sin(ts / (86400 * 90)) + 0.05 * np.sin(ts / 21600 + seed % 7)
+                       + 0.002 * wobble)
+
+    close = price(t)
+    open_ = price(t - 60)
+    spread = 0.0015 * _hash01(t, seed + 1)
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = 0.5 + 20 * _hash01(t, seed + 2)
+    return t, low, high, open_, close, volume
+
+
+def candles(product_id, start, end, granularity, gap_rate):
+    "Candles with bucket time in [start, end], newest first, rounded like Coinbase"
+    first_bucket = -(-start // granularity) * granularity
+    last_bucket = min(end, int(time.time())) // granularity * granularity
+    if last_bucket < first_bucket:
+        return []
+
+    t, low, high, open_, close, volume = minute_candles(
+        product_id, first_bucket, last_bucket + granularity, gap_rate)
+    if len(t) == 0:
+        return []
+
+    # === Aggregate 1m → granularity (first / max / min / last / sum) ===
+    buckets = t // granularity * granularity
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(t)] - 1
+
+    rows = zip(
+        buckets[starts].tolist(),
+        np.minimum.reduceat(low, starts).round(6).tolist(),
+        np.maximum.reduceat(high, starts).round(6).tolist(),
+        open_[starts].round(6).tolist(),
+        close[ends].round(6).tolist(),
+        np.add.reduceat(volume, starts).round(8).tolist(),
+    )
+    return [list(row) for row in rows][::-1]
+
+
+class FakeCoinbaseHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    settings = {}
+
+    def log_message(self, format, *args):
+        if self.settings.get("verbose"):
+            super().log_message(format, *args)
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject_faults(self):
+        "Latency, rate limiting and random 429 / 5xx. Returns True if a fault response was sent."
+        s = self.settings
+        with s["lock"]:
+            latency = s["latency_ms"] + s["rng"].uniform(0, s["jitter_ms"])
+            roll_429 = s["rng"].random()
+            roll_5xx = s["rng"].random()
+            status_5xx = s["rng"].choice([500, 502, 503, 504])
+            throttled = False
+            if s["rate_limit"]:
+                now = time.monotonic()
+                s["tokens"] = min(s["rate_limit"], s["tokens"] + (now - s["last"]) * s["rate_limit"])
+                s["last"] = now
+                if s["tokens"] >= 1:
+                    s["tokens"] -= 1
+                else:
+                    throttled = True
+            s["requests"] += 1
+
+        if latency:
+            time.sleep(latency / 1000)
+        if throttled or roll_429 < s["error_rate_429"]:
+            self._send(429, {"message": "Public rate limit exceeded"}, {"Retry-After": "1"})
+            return True
+        if roll_5xx < s["error_rate_5xx"]:
+            self._send(status_5xx, {"message": "Internal server error"})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        if len(parts) < 2 or parts[0] != "products" or parts[1].count("-") != 1:
+            return self._send(404, {"message": "NotFound"})
+        if self._inject_faults():
+            return
+
+        product_id = parts[1].upper()
+        if len(parts) == 2:
+            base, quote = product_id.split("-")
+            return self._send(200, {
+                "id": product_id,
+                "base_currency": base,
+                "quote_currency": quote,
+                "quote_increment": "0.01",
+                "base_increment": "0.00000001",
+                "display_name": f"{base}/{quote}",
+                "min_market_funds": "1",
+                "margin_enabled": False,
+                "post_only": False,
+                "limit_only": False,
+                "cancel_only": False,
+                "status": "online",
+                "status_message": "",
+                "auction_mode": False,
+            })
+        if len(parts) != 3 or parts[2] != "candles":
+            return self._send(404, {"message": "NotFound"})
+
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        granularity = int(query.get("granularity", 60))
+        if granularity not in GRANULARITIES:
+            return self._send(400, {"message": "Unsupported granularity"})
+
+        try:
+            end = _epoch(query["end"]) if "end" in query else int(time.time())
+            start = _epoch(query["start"]) if "start" in query else end - (MAX_CANDLES - 1) * granularity
+        except ValueError:
+            return self._send(400, {"message": "Invalid start/end"})
+        if start > end:
+            return self._send(400, {"message": "start must be before end"})
+        if (end - start) / granularity > MAX_CANDLES:
+            return self._send(400, {"message": "granularity too small for the requested time range. "
+                                               "Count of aggregations requested exceeds 300"})
+
+        rows = candles(product_id, start, end, granularity, self.settings["gap_rate"])
+        self._send(200, rows[:MAX_CANDLES])
+
+
+def start_server(host="127.0.0.1", port=0, latency_ms=0, jitter_ms=0, error_rate_429=0.0,
+                 error_rate_5xx=0.0, rate_limit=0, gap_rate=0.001, seed=42, verbose=False):
+    "Start the fake API in a background thread. Returns (server, base_url)."
+    handler = type("Handler", (FakeCoinbaseHandler,), {"settings": {
+        "latency_ms": latency_ms,
+        "jitter_ms": jitter_ms,
+        "error_rate_429": error_rate_429,
+        "error_rate_5xx": error_rate_5xx,
+        "rate_limit": rate_limit,
+        "tokens": float(rate_limit),
+        "last": time.monotonic(),
+        "gap_rate": gap_rate,
+        "rng": random.Random(seed),
+        "lock": threading.Lock(),
+        "requests": 0,
+        "verbose": verbose,
+    }})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+# ==== MAIN RUN ====
+if __name__ == "__main__":
+    server, base_url = start_server(
+        port=int(os.getenv("FAKE_PORT", "8765")),
+        latency_ms=float(os.getenv("FAKE_LATENCY_MS", "0")),
+        jitter_ms=float(os.getenv("FAKE_JITTER_MS", "0")),
+        error_rate_429=float(os.getenv("FAKE_ERROR_RATE_429", "0")),
+        error_rate_5xx=float(os.getenv("FAKE_ERROR_RATE_5XX", "0")),
+        rate_limit=float(os.getenv("FAKE_RATE_LIMIT", "0")),
+        gap_rate=float(os.getenv("FAKE_GAP_RATE", "0.001")),
+        seed=int(os.getenv("FAKE_SEED", "42")),
+        verbose=True,
+    )
+    print(f"🧪 Fake Coinbase API running at {base_url}")
+    print(f"💡 Point the fetch scripts at it with COINBASE_BASE_URL=\"{base_url}\"")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("👋 Fake server stopped.")
@@ -0,0 +1,112 @@
+'''
+Gap detection + compact interval index for historical candles.
+
+Gaps are stored as half-open epoch intervals [start, end) per series (e.g. "BTCUSD-1m"),
+in data/gap_index.json:
+
+    {
+      "BTCUSD-1m": {"granularity": 60, "missing": [[1688169600, 1688170200]], "empty": [...]},
+      ...
+    }
+
+"missing" = not in our data yet, "empty" = Coinbase returned nothing for it (no trades),
+so a repair never asks for the same hole twice.
+
+coalesce_windows() turns the gaps into the fewest 300-candle requests that cover them.
+'''
+
+# ===== Imports =====
+import json
+import numpy as np
+from pathlib import Path
+
+# === CONFIG ===
+project_root = Path(__file__).resolve().parent.parent
+GAP_INDEX_FILE = project_root / "data" / "gap_index.json"
+MAX_CANDLES = 300
+
+
+def find_gaps(epochs, granularity):
+    "Missing [start, end) intervals between sorted epoch seconds (vectorized)"
+    epochs = np.asarray(epochs, dtype=np.int64)
+    if len(epochs) < 2:
+        return []
+    steps = np.diff(epochs)
+    holes = np.nonzero(steps > granularity)[0]
+    return [[int(epochs[i]) + granularity, int(epochs[i + 1])] for i in holes]
+
+
+def subtract_intervals(intervals, remove):
+    "intervals minus remove (both lists of [start, end), sorted)"
+    result = []
+    remove = sorted(remove)
+    for start, end in sorted(intervals):
+        for r_start, r_end in remove:
+            if r_end <= start or r_start >= end:
+                continue
+            if r_start > start:
+                result.append([start, r_start])
+            start = max(start, r_end)
+            if start >= end:
+                break
+        if start < end:
+            result.append([start, end])
+    return result
+
+
+def coalesce_windows(gaps, granularity, max_candles=MAX_CANDLES):
+    """Fewest (start, end) request windows of <= max_candles that cover every gap.
+    Neighbouring small gaps share one request; long gaps are split."""
+    span = max_candles * granularity
+    windows = []
+    for start, end in sorted(gaps):
+        # Extend the previous window if this gap still fits inside it
+        if windows and start < windows[-1][0] + span:
+            window_start = windows[-1][0]
+            windows[-1] = (window_start, min(max(windows[-1][1], end), window_start + span))
+            start = windows[-1][1]
+        while start < end:
+            window_end = min(start + span, end)
+            windows.append((start, window_end))
+            start = window_end
+    return windows
+
+
+def count_candles(intervals, granularity):
+    return sum((end - start) // granularity for start, end in intervals)
+
+
+def load_index(path=GAP_INDEX_FILE):
+    if Path(path).exists():
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def save_index(index, path=GAP_INDEX_FILE):
+    with open(path, "w") as f:
+        json.dump(index, f, indent=2)
+
+
+def record_scan(index, series_id, granularity, gaps):
+    "Store a fresh scan, leaving out holes we already know Coinbase has no data for"
+    entry = index.get(series_id, {})
+    empty = entry.get("empty", [])
+    index[series_id] = {
+        "granularity": granularity,
+        "missing": subtract_intervals(gaps, empty),
+        "empty": empty,
+    }
+    return index[series_id]
+
+
+def record_repair(index, series_id, still_missing, fetched_windows):
+    """After a repair: holes inside windows the API answered (200) are confirmed empty;
+    holes in windows that failed (retries / budget exhausted) stay "missing" for the next run"""
+    entry = index[series_id]
+    fetched = [list(window) for window in fetched_windows]
+    unanswered = subtract_intervals(still_missing, fetched)
+    confirmed = subtract_intervals(still_missing, unanswered)
+    entry["empty"] = sorted(entry.get("empty", []) + confirmed)
+    entry["missing"] = unanswered
+    return entry
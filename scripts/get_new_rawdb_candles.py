@@ -1,57 +1,42 @@
 ''''
 Looks at historical data in Postgres and fetches new candles from Coinbase API. Basically doing what
 coinbase_data_resumable_all.py does, but only for one symbol and timeframe for now
- 
+
+Run it directly (SYMBOL / TIMEFRAME env vars), or import it — orchestrator_db.py calls
+fetch_new_data(symbol, timeframe, cur) in-process with its own pooled connection.
 '''
 
 
 # ===== Imports =====
-import pandas as pd
 import datetime
 import os
 from dotenv import load_dotenv
 from pathlib import Path
-import requests
 import time
-import psycopg2
-from psycopg2.extras import execute_values
 import sys
+from async_fetcher import iter_candle_batches
+from candle_decoder import candles_to_frame
+from candle_sinks import PostgresRawSink
+from candle_store import CANDLE_STORE
+from db_utils import connect
+from ingest_state import create_state_table, get_state
+from listing_date import get_listing_date
 
 # === Fix Windows Unicode encoding for emojis ===
 if sys.platform == "win32":
-    import io
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
 
 # === Load .env ===
 project_root = Path(__file__).resolve().parent.parent
 env_path = project_root / ".env"
 load_dotenv(env_path)
 
-# === DB credentials ===
-DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
-
 api_key = os.getenv('COINBASE_API_KEY')
 api_secret = os.getenv('COINBASE_API_SECRET')
 
 SAVE_TO_POSTGRES = True
 
-# === Connect to Postgres ===
-conn = psycopg2.connect(
-    dbname=DB_NAME,
-    user=DB_USER,
-    password=DB_PASSWORD,
-    host=DB_HOST,
-    port=DB_PORT
-)
-conn.autocommit = True
-cur = conn.cursor()
-print(f"✅ Connected to DB: {DB_NAME}")
-
 def sign_request(method, path, body='', timestamp=None):
     timestamp = timestamp or str(int(time.time()))
     headers = {
@@ -70,20 +55,19 @@ def timeframe_to_granularity(timeframe):
     elif 'd' in timeframe:
         return int(''.join([c for c in timeframe if c.isnumeric()])) * 86400
 
-def fetch_new_data(symbol, timeframe):
-    base_url = "https://api.exchange.coinbase.com"
-
-    # === Get latest datetime in historical table ===
+def fetch_new_data(symbol, timeframe, cur):
+    "Stream candles newer than {pair}_{tf} into {pair}_{tf}_raw. Returns candles fetched."
+    # === Get latest datetime in historical table (ingest_state watermark) ===
     pair = symbol.replace('-', '').lower()
-    hist_table = f"{pair}_{timeframe}_raw".replace("_raw", "")
-    cur.execute(f"SELECT MAX(datetime) FROM {hist_table};")
-    latest = cur.fetchone()[0]
+    hist_table = None if CANDLE_STORE == "unified" else f"{pair}_{timeframe}"
+    latest = get_state(cur, symbol, timeframe, table=hist_table)["last_ts"]
 
     granularity = timeframe_to_granularity(timeframe)
 
     if latest is None:
-        print("⚠️ No data in historical table. Starting from default (2010-07-17).")
-        start_time = datetime.datetime(2010, 7, 17)  # Oldest BTC timestamp for safety
+        # Start at the product's first real candle instead of walking empty pre-listing windows
+        start_time = get_listing_date(symbol) or datetime.datetime(2010, 7, 17)  # Oldest BTC timestamp for safety
+        print(f"⚠️ No data in historical table. Starting from first candle ({start_time}).")
     else:
         # ✅ Adjust to fetch starting from NEXT candle to avoid re-fetching last
         start_time = latest + datetime.timedelta(seconds=granularity)
@@ -98,84 +82,33 @@ def fetch_new_data(symbol, timeframe):
     if end_time.tzinfo is None:
         end_time = end_time.replace(tzinfo=datetime.timezone.utc)
     
-    max_candles = 300
-    chunk_seconds = max_candles * granularity
-
-    all_candles = []
-    current_start_ts = int(start_time.timestamp())
-    end_ts = int(end_time.timestamp())
-
-    while current_start_ts < end_ts:
-        current_end_ts = min(current_start_ts + chunk_seconds, end_ts)
-        start_dt = datetime.datetime.utcfromtimestamp(current_start_ts)
-        end_dt = datetime.datetime.utcfromtimestamp(current_end_ts)
-
-        print(f"📊 Fetching from {start_dt} to {end_dt}")
-
-        params = {
-            'start': start_dt.isoformat(),
-            'end': end_dt.isoformat(),
-            'granularity': str(granularity)
-        }
-
-        path = f"/products/{symbol}/candles"
-        for attempt in range(5):
-            response = requests.get(f"{base_url}{path}", params=params)
-            if response.status_code == 200:
-                candles = response.json()
-                all_candles.extend(candles)
-                break
-            elif response.status_code in [500, 502, 503, 504]:
-                time.sleep(2 ** attempt)
-            else:
-                raise Exception(f"API Error: {response.status_code} - {response.text}")
-
-        current_start_ts = current_end_ts
-        time.sleep(0.5)
-
-    print(f"✨ Fetched {len(all_candles)} candles!")
-
-    if all_candles:
-        df = pd.DataFrame(all_candles, columns=['datetime','low','high','open','close','volume'])
-        df['datetime'] = pd.to_datetime(df['datetime'], unit='s')
-        df = df[['datetime','open','high','low','close','volume']]
-        df = df.sort_values('datetime')
-
-        # === Insert into _raw table ===
-        raw_table = f"{pair}_{timeframe}_raw"
-        cur.execute(f"""
-            CREATE TABLE IF NOT EXISTS {raw_table} (
-                datetime TIMESTAMP PRIMARY KEY,
-                open NUMERIC,
-                high NUMERIC,
-                low NUMERIC,
-                close NUMERIC,
-                volume NUMERIC
-            );
-        """)
-
-        rows = [tuple(r) for r in df.to_numpy()]
-        execute_values(
-            cur,
-            f"""
-            INSERT INTO {raw_table} (datetime, open, high, low, close, volume)
-            VALUES %s
-            ON CONFLICT (datetime) DO NOTHING;
-            """,
-            rows
-        )
-        print(f"✅ Inserted {len(rows)} rows into {raw_table}")
+    # === Stream chunks straight into the _raw table ===
+    raw_table = f"{pair}_{timeframe}_raw"
+    sink = PostgresRawSink(cur, raw_table)
+
+    for batch in iter_candle_batches(symbol, granularity, int(start_time.timestamp()), int(end_time.timestamp())):
+        sink.write(candles_to_frame(batch))
+    sink.close()
+
+    print(f"✨ Fetched {sink.rows} candles!")
+    return sink.rows
 
 # ==== MAIN RUN ====
+if __name__ == "__main__":
+    SYMBOL = os.getenv("SYMBOL", "TAO-USD") # Default to TAO-USD if not set
+    TIMEFRAME = os.getenv("TIMEFRAME", "1d") # Default to 1d if not set
+
+    conn = connect()
+    cur = conn.cursor()
+    print(f"✅ Connected to DB: {os.getenv('DB_NAME')}")
 
-SYMBOL = os.getenv("SYMBOL", "TAO-USD") # Default to TAO-USD if not set
-TIMEFRAME = os.getenv("TIMEFRAME", "1d") # Default to 1d if not set
+    create_state_table(cur)
+    fetch_new_data(SYMBOL, TIMEFRAME, cur)
 
-fetch_new_data(SYMBOL, TIMEFRAME)
+    cur.close()
+    conn.close()
+    print("🔑 DB connection closed.")
 
-cur.close()
-conn.close()
-print("🔑 DB connection closed.")
 
 
 
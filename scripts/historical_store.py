@@ -0,0 +1,319 @@
+'''
+Historical candle files (data/historical) in CSV — the original layout — or Parquet.
+
+    BTCUSD-1m=historical-data.csv       ← HISTORICAL_FORMAT=csv (default)
+    BTCUSD-1m=historical-data.parquet   ← HISTORICAL_FORMAT=parquet
+    BTCUSD-1m/2025-06.parquet           ← HISTORICAL_FORMAT=partitioned: one file per month (1m / 5m)
+    BTCUSD-1d/2025.parquet                 or per year (coarser timeframes), like candle_store's partitions
+
+Parquet keeps typed columns (timestamp + float64) with zstd compression, so nothing is parsed
+from text and reads can pick columns: read_historical(path, columns=[]) loads just the datetimes.
+Partitioned series can also be read / written a few partitions at a time, so appending a day of
+candles only rewrites the month (or year) file they fall into — see merge_append.py.
+
+Scripts go through list_series / find_historical / read_historical / write_historical and work
+with whichever format a series is stored in (a series only ever has one of them).
+
+Every write also leaves a sidecar next to the series (BTCUSD-1m=historical-data.csv.meta.json,
+BTCUSD-1m.meta.json for a folder) with its last candle, row count, size / mtime and a CRC of the
+file's tail. last_timestamp() answers from the sidecar while it still matches the file, and
+otherwise from the file itself without loading it: a CSV is read backwards from EOF to its last
+complete line, Parquet from the footers and the newest file's datetime column.
+
+Convert an existing folder (the source is removed once the copy reads back identical):
+
+    python scripts/historical_store.py to-partitioned
+    python scripts/historical_store.py to-parquet
+    python scripts/historical_store.py to-csv
+'''
+
+# ===== Imports =====
+import json
+import os
+import shutil
+import sys
+import time
+import zlib
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+# === Fix Windows Unicode encoding for emojis ===
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+# === Load .env ===
+project_root = Path(__file__).resolve().parent.parent
+load_dotenv(project_root / ".env")
+
+# === CONFIG ===
+HISTORICAL_DIR = Path(os.getenv("DATA_DIR", project_root / "data")) / "historical"
+HISTORICAL_FORMAT = os.getenv("HISTORICAL_FORMAT", "csv").lower()  # "csv", "parquet" or "partitioned"
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "partitioned": ""}
+FILE_TAG = "=historical-data"
+PARQUET_COMPRESSION = "zstd"
+SIDECAR_SUFFIX = ".meta.json"
+TAIL_BYTES = 4096  # block size for reading a CSV backwards from EOF (and the CRC'd tail)
+MONTHLY_TIMEFRAMES = ["1m", "5m"]  # same split as candle_store's table partitions
+
+
+def historical_file(series_id, fmt=None, historical_dir=HISTORICAL_DIR):
+    "Path a series is written to in a given format (default HISTORICAL_FORMAT) — a directory if partitioned"
+    fmt = fmt or HISTORICAL_FORMAT
+    if fmt == "partitioned":
+        return Path(historical_dir) / series_id
+    return Path(historical_dir) / f"{series_id}{FILE_TAG}{FORMATS[fmt]}"
+
+
+def find_historical(series_id, historical_dir=HISTORICAL_DIR):
+    "Existing file / partition directory for a series (configured format first), or None"
+    for fmt in [HISTORICAL_FORMAT] + [f for f in FORMATS if f != HISTORICAL_FORMAT]:
+        path = historical_file(series_id, fmt, historical_dir)
+        if path.is_file() or (path.is_dir() and partition_files(path)):
+            return path
+    return None
+
+
+def list_series(historical_dir=HISTORICAL_DIR):
+    "Series ids (e.g. BTCUSD-1m) with historical data in any format"
+    historical_dir = Path(historical_dir)
+    files = {path.name.split('=')[0]
+             for ext in (".csv", ".parquet") for path in historical_dir.glob(f"*{FILE_TAG}{ext}")}
+    folders = {path.name for path in historical_dir.glob("*-*") if path.is_dir() and partition_files(path)}
+    return sorted(files | folders)
+
+
+# === Partitioned layout ===
+def partition_keys(index, timeframe):
+    "Partition name per row: '2025-06' for monthly timeframes, '2025' otherwise"
+    monthly = timeframe in MONTHLY_TIMEFRAMES
+    codes = np.asarray(index.year * 100 + index.month if monthly else index.year)
+    periods, rows = np.unique(codes, return_inverse=True)
+    names = np.array([f"{p // 100}-{p % 100:02d}" if monthly else f"{p}" for p in periods])
+    return names[rows]
+
+
+def partition_files(folder):
+    "{partition name: path}, in time order"
+    return {path.stem: path for path in sorted(Path(folder).glob("*.parquet"))}
+
+
+def _timeframe(path):
+    return Path(path).name.split('=')[0].split('-')[1]
+
+
+def _write_parquet(df, path):
+    tmp = path.with_name(path.name + ".tmp")
+    df.rename_axis('datetime').astype('float64').to_parquet(tmp, compression=PARQUET_COMPRESSION)
+    os.replace(tmp, path)
+
+
+def read_historical(path, columns=None, partitions=None):
+    """DataFrame indexed by datetime; `columns` limits the OHLCV columns read ([] = index only).
+    For a partitioned series, `partitions` limits which partition files are read (missing ones are skipped)."""
+    path = Path(path)
+    if path.is_dir():
+        files = partition_files(path)
+        names = files if partitions is None else [p for p in sorted(set(partitions)) if p in files]
+        frames = [pd.read_parquet(files[name], columns=columns) for name in names]
+        if not frames:
+            return pd.DataFrame(columns=columns if columns is not None else [],
+                                index=pd.DatetimeIndex([], name='datetime'), dtype='float64')
+        return pd.concat(frames) if len(frames) > 1 else frames[0]
+    if path.suffix == ".parquet":
+        return pd.read_parquet(path, columns=columns)
+    usecols = None if columns is None else ['datetime'] + list(columns)
+    return pd.read_csv(path, index_col='datetime', parse_dates=True, usecols=usecols)
+
+
+def write_historical(df, path):
+    """Write a series; every file is replaced atomically so readers never see half of it.
+    For a partitioned series only the partitions `df` covers are (re)written — the rest are left alone,
+    so df must hold the complete contents of each partition it touches. Returns the files written."""
+    path = Path(path)
+    if path.suffix == ".csv":
+        tmp = path.with_name(path.name + ".tmp")
+        df.to_csv(tmp)
+        os.replace(tmp, path)
+        write_sidecar(path, df.index.max() if len(df) else None, len(df))
+        return [path]
+    if path.suffix == ".parquet":
+        _write_parquet(df, path)
+        write_sidecar(path, df.index.max() if len(df) else None, len(df))
+        return [path]
+
+    path.mkdir(parents=True, exist_ok=True)
+    written = []
+    for name, part in df.groupby(partition_keys(df.index, _timeframe(path)), sort=True):
+        written.append(path / f"{name}.parquet")
+        _write_parquet(part, written[-1])
+    write_sidecar(path, *_parquet_tail(path))  # totals span partitions this write didn't touch
+    return written
+
+
+# === Last candle without loading the series ===
+def sidecar_file(path):
+    return Path(path).with_name(Path(path).name + SIDECAR_SUFFIX)
+
+
+def _fingerprint(path):
+    "size, mtime and CRC of the last TAIL_BYTES — of the newest partition for a folder"
+    path = Path(path)
+    if path.is_dir():
+        files = partition_files(path)
+        if not files:
+            return None
+        path = list(files.values())[-1]
+    stat = path.stat()
+    with open(path, "rb") as f:
+        f.seek(max(stat.st_size - TAIL_BYTES, 0))
+        crc = zlib.crc32(f.read())
+    return {"file": path.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "tail_crc32": crc}
+
+
+def write_sidecar(path, last_ts, row_count):
+    sidecar = sidecar_file(path)
+    meta = {"last_ts": pd.Timestamp(last_ts).isoformat() if last_ts is not None else None,
+            "row_count": int(row_count), **_fingerprint(path)}
+    tmp = sidecar.with_name(sidecar.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, sidecar)
+
+
+def read_sidecar(path):
+    "The sidecar's contents if it still describes the file as it is now, else None"
+    sidecar = sidecar_file(path)
+    if not sidecar.exists():
+        return None
+    try:
+        with open(sidecar, "r") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    current = _fingerprint(path)
+    if current is None or any(meta.get(k) != v for k, v in current.items()):
+        return None
+    return meta
+
+
+def tail_line(csv_file):
+    """Last non-blank line of a text file, found by reading backwards from EOF; None if none.
+    Trailing blank / whitespace-only lines are skipped; a last line without a final newline still counts
+    (files are replaced atomically, so it can't be half-written)."""
+    with open(csv_file, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        buffer = b""
+        while position > 0:
+            step = min(TAIL_BYTES, position)
+            position -= step
+            f.seek(position)
+            buffer = f.read(step) + buffer
+            lines = buffer.split(b"\n")
+            whole = lines if position == 0 else lines[1:]  # lines[0] is whole once its start is seen
+            for line in reversed(whole):
+                if line.strip():
+                    return line.decode().strip()
+    return None
+
+
+def _csv_tail(csv_file):
+    "Newest candle of a CSV (historical files are written sorted, so it's the last row)"
+    line = tail_line(csv_file)
+    if line is None or line.startswith("datetime"):  # header only
+        return None
+    return pd.Timestamp(line.split(",", 1)[0]).to_pydatetime()
+
+
+def _parquet_tail(path):
+    "(last ts, row count) from the Parquet footers + the newest file's datetime column"
+    import pyarrow.parquet as pq
+    path = Path(path)
+    files = list(partition_files(path).values()) if path.is_dir() else [path]
+    if not files:
+        return None, 0
+    rows = sum(pq.ParquetFile(f).metadata.num_rows for f in files)
+    index = pd.read_parquet(files[-1], columns=[]).index
+    return (index.max().to_pydatetime() if len(index) else None), rows
+
+
+def last_timestamp(path):
+    """(last candle time, row count, source) for a historical file or folder.
+    source is "sidecar", "tail" (CSV read backwards; row count unknown → None) or "parquet"."""
+    meta = read_sidecar(path)
+    if meta is not None:
+        last_ts = pd.Timestamp(meta["last_ts"]).to_pydatetime() if meta["last_ts"] else None
+        return last_ts, meta["row_count"], "sidecar"
+    if Path(path).suffix == ".csv":
+        return _csv_tail(path), None, "tail"
+    last_ts, rows = _parquet_tail(path)
+    return last_ts, rows, "parquet"
+
+
+def merge_sorted_tail(df_hist, df_new):
+    """Merge new candles into a time-sorted history in O(new + overlap) instead of re-indexing all of it:
+    binary-search where the new rows start, dedup only against the history from there on, then append
+    (or re-sort just that tail when new rows fall inside it). Existing candles win over new ones.
+    Returns (merged frame, rows added, position in df_hist where the overlap starts)."""
+    if not df_hist.index.is_monotonic_increasing:  # one linear pass; files are written sorted
+        df_hist = df_hist.sort_index()
+    if not df_new.index.is_monotonic_increasing:
+        df_new = df_new.sort_index(kind='stable')  # stable: the last copy of a repeated candle still wins
+    df_new = df_new[~df_new.index.duplicated(keep='last')]
+    if df_new.empty:
+        return df_hist, 0, len(df_hist)
+
+    seam = int(df_hist.index.searchsorted(df_new.index[0], side='left'))
+    overlap = df_hist.iloc[seam:]
+    only_new = df_new[~df_new.index.isin(overlap.index)]
+    if only_new.empty:
+        return df_hist, 0, seam
+    if df_hist.empty:
+        return only_new, len(only_new), seam
+    if only_new.index[0] > df_hist.index[-1]:
+        merged = pd.concat([df_hist, only_new])  # the usual case: a pure tail append
+    else:
+        merged = pd.concat([df_hist.iloc[:seam], pd.concat([overlap, only_new]).sort_index()])
+    return merged, len(only_new), seam
+
+
+def _size(path):
+    path = Path(path)
+    return sum(f.stat().st_size for f in path.glob("*.parquet")) if path.is_dir() else path.stat().st_size
+
+
+def convert(series_id, fmt, historical_dir=HISTORICAL_DIR):
+    "Rewrite one series in `fmt`, check it reads back the same, then drop the old copy. Returns both sizes."
+    source = find_historical(series_id, historical_dir)
+    target = historical_file(series_id, fmt, historical_dir)
+    if source is None or source == target:
+        return None
+    df = read_historical(source)
+    write_historical(df, target)
+    check = read_historical(target, columns=[])
+    if len(check) != len(df) or not check.index.equals(df.index):
+        shutil.rmtree(target) if target.is_dir() else target.unlink()
+        raise ValueError(f"{target.name} does not match {source.name}")
+    sizes = _size(source), _size(target)
+    shutil.rmtree(source) if source.is_dir() else source.unlink()
+    sidecar_file(source).unlink(missing_ok=True)
+    return source, target, sizes
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("to-parquet", "to-csv", "to-partitioned"):
+        print("Usage: python scripts/historical_store.py to-partitioned | to-parquet | to-csv")
+        sys.exit(1)
+    fmt = sys.argv[1].split('-')[1]
+
+    for series_id in list_series():
+        started = time.time()
+        converted = convert(series_id, fmt)
+        if converted is None:
+            print(f"⏭️  {series_id} already {fmt}")
+            continue
+        source, target, (before, after) = converted
+        print(f"🔄 {source.name} ({before / 1e6:.1f} MB) → {target.name} ({after / 1e6:.1f} MB) "
+              f"in {time.time() - started:.1f}s")
@@ -1,10 +1,11 @@
 """
 historical_to_postgres.py
 
-This script loops through all CSVs in 'data/historical',
+This script loops through all historical files in 'data/historical',
 DROPS each table first (for a fresh load),
 then recreates it,
-and inserts ALL rows efficiently using execute_values.
+and streams ALL rows in with COPY (db_utils.copy_candles) — a CSV is never parsed in Python,
+a Parquet file (historical_store.py) is read column-wise and sent the same way.
 
 Later, this same pattern can handle live streaming too.
 
@@ -15,8 +16,11 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 import psycopg2
-from psycopg2.extras import execute_values
-import pandas as pd
+from candle_store import symbol_from_pair
+from db_utils import copy_candles, create_candle_table, transaction
+from historical_store import find_historical, list_series, read_historical
+from ingest_state import create_state_table, set_state
+from manage_indexes import ensure_indexes, maintain
 
 # === 1️⃣ CONFIG ===
 
@@ -37,7 +41,7 @@ DB_PORT = os.getenv("DB_PORT")
 print(f"✅ Loaded DB config from .env: {DB_NAME}@{DB_HOST}:{DB_PORT}")
 
 # Folder with historical CSVs
-historical_dir = project_root / "data" / "historical"
+historical_dir = Path(os.getenv("DATA_DIR", project_root / "data")) / "historical"  # DATA_DIR: tests / benchmarks
 
 # === 2️⃣ CONNECT ===
 
@@ -57,62 +61,41 @@ except Exception as e:
     exit()
 
 cur = conn.cursor()
+create_state_table(cur)
 
 # === 3️⃣ LOOP THROUGH HISTORICAL FILES ===
 
-for csv_file in historical_dir.glob("*.csv"):
+for pair_time in list_series(historical_dir):
     # Example: BTCUSD-1d=historical-data.csv → btcusd_1d
-    pair_time = csv_file.stem.split("=")[0]
+    hist_file = find_historical(pair_time, historical_dir)
     pair, timeframe = pair_time.split("-")
     table_name = f"{pair.lower()}_{timeframe}"
 
-    print(f"\n📄 Processing {csv_file.name} -> Table: {table_name}")
-
-    # Load CSV
-    df = pd.read_csv(csv_file, parse_dates=['datetime'], index_col='datetime').reset_index()
-
-    # === DROP existing table ===
-    drop_sql = f"DROP TABLE IF EXISTS {table_name};"
-    cur.execute(drop_sql)
-    print(f"🗑️  Dropped table if existed: {table_name}")
-
-    # === Recreate table ===
-    create_sql = f"""
-    CREATE TABLE {table_name} (
-        datetime TIMESTAMP PRIMARY KEY,
-        open NUMERIC,
-        high NUMERIC,
-        low NUMERIC,
-        close NUMERIC,
-        volume NUMERIC
-    );
-    """
-    cur.execute(create_sql)
-    print(f"✅ Recreated table: {table_name}")
-
-    # === Bulk insert with execute_values ===
-    rows = [
-        (
-            row['datetime'],
-            row['open'],
-            row['high'],
-            row['low'],
-            row['close'],
-            row['volume']
-        )
-        for _, row in df.iterrows()
-    ]
-
-    insert_sql = f"""
-    INSERT INTO {table_name} (datetime, open, high, low, close, volume)
-    VALUES %s
-    ON CONFLICT (datetime) DO NOTHING;
-    """
-
-    execute_values(cur, insert_sql, rows)
-    print(f"✅ Inserted rows for {table_name}: {len(rows)}")
+    print(f"\n📄 Processing {hist_file.name} -> Table: {table_name}")
+
+    # === Drop, recreate, load + ingest_state in one transaction ===
+    with transaction(cur):
+        drop_sql = f"DROP TABLE IF EXISTS {table_name};"
+        cur.execute(drop_sql)
+        print(f"🗑️  Dropped table if existed: {table_name}")
+
+        create_candle_table(cur, table_name)
+        print(f"✅ Recreated table: {table_name}")
+
+        # === Bulk load with COPY ===
+        source = hist_file if hist_file.suffix == ".csv" else read_historical(hist_file)
+        rows = copy_candles(cur, table_name, source)
+        print(f"✅ Inserted rows for {table_name}: {rows}")
+
+        # === Watermark for the fresh table (the old row described the dropped one) ===
+        cur.execute(f"SELECT MAX(datetime) FROM {table_name};")
+        set_state(cur, symbol_from_pair(pair), timeframe, cur.fetchone()[0], rows)
+
+    # === Indexes + fresh stats after the bulk load ===
+    ensure_indexes(cur, table_name, timeframe)
+    maintain(cur, table_name)
 
 # === 4️⃣ CLEAN UP ===
 cur.close()
 conn.close()
-print("\n🎉 Fresh upload complete — all historical CSVs pushed fast to PostgreSQL!")
+print("\n🎉 Fresh upload complete — all historical files pushed fast to PostgreSQL!")
@@ -0,0 +1,99 @@
+'''
+Shared pooled HTTP client for every Coinbase call.
+
+One requests.Session per process, so TCP + TLS handshakes are reused across the
+thousands of 300-candle requests in a backfill (keep-alive + gzip).
+
+Usage:
+    from http_client import get_session
+    response = get_session().get(url, params=params)
+
+Point every fetch script at another server (e.g. fake_coinbase_server.py) with:
+    COINBASE_BASE_URL="http://127.0.0.1:8765"
+
+Pool sizes can be tuned from .env:
+    HTTP_POOL_SIZE=16                                  # default connections kept per host
+    HTTP_HOST_POOL_SIZES="api.exchange.coinbase.com=32" # per-host overrides, comma separated
+'''
+
+# ===== Imports =====
+import os
+import threading
+from pathlib import Path
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+# === Load .env (before reading any settings below) ===
+project_root = Path(__file__).resolve().parent.parent
+load_dotenv(project_root / ".env")
+
+# === CONFIG ===
+BASE_URL = os.getenv("COINBASE_BASE_URL", "https://api.exchange.coinbase.com").rstrip("/")
+DEFAULT_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+DEFAULT_TIMEOUT = 30  # seconds
+
+_session = None
+_lock = threading.Lock()
+
+
+def parse_host_pool_sizes(raw):
+    "Parse 'host=size,host=size' into a dict"
+    sizes = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        host, size = item.split("=", 1)
+        sizes[host.strip()] = int(size)
+    return sizes
+
+
+class PooledSession(requests.Session):
+    "requests.Session with a default timeout so a dead socket can't hang a backfill"
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+def build_session(pool_size=DEFAULT_POOL_SIZE, host_pool_sizes=None):
+    session = PooledSession()
+    session.headers.update({
+        'accept': 'application/json',
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+        'User-Agent': 'coinbase-data-fetcher',
+    })
+
+    # One pool per host, each keeping up to pool_size connections alive
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    # Per-host overrides (longest prefix wins in requests)
+    if host_pool_sizes is None:
+        host_pool_sizes = parse_host_pool_sizes(os.getenv("HTTP_HOST_POOL_SIZES"))
+    for host, size in host_pool_sizes.items():
+        host_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size, pool_block=True)
+        session.mount(f"https://{host}", host_adapter)
+        session.mount(f"http://{host}", host_adapter)
+
+    return session
+
+
+def get_session():
+    "Process-wide shared session (created on first use)"
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def close_session():
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
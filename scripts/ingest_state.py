@@ -0,0 +1,191 @@
+'''
+Ingest watermarks: last candle time, row count and last run status per (symbol, timeframe),
+so the pipelines can decide what to fetch without MAX(datetime) / COUNT(*) scans or CSV reads.
+
+Postgres pipelines use the `ingest_state` table, updated in the same transaction as the insert:
+
+    state = get_state(cur, "BTC-USD", "1m", table="btcusd_1m")   # bootstraps from the table once
+    with transaction(cur):
+        rows, last_ts = promote_raw(cur, "btcusd_1m", "btcusd_1m_raw", state["last_ts"], with_last_ts=True)
+        record_insert(cur, "BTC-USD", "1m", rows, last_ts)
+
+A full reload (historical_to_postgres.py) overwrites the row with set_state() instead. Anything that
+deletes or replaces rows another way (verify_and_delete_test_rows.py, copy_rawdb_to_historicaldb.py,
+db_restore.py) calls reset_state() so the next get_state() re-seeds it from the table.
+
+The CSV fetcher only advances last_ts when it writes an append file; row_count grows when
+merge_append.py / repair_gaps.py actually add the rows to data/historical.
+
+CSV pipelines use FileIngestState (data/ingest_state.json, replaced atomically on every save),
+keyed by series id like "BTCUSD-1m". It picks up an old data/last_timestamps.json the first time.
+'''
+
+# ===== Imports =====
+import datetime
+import json
+import os
+import threading
+from pathlib import Path
+
+# === CONFIG ===
+project_root = Path(__file__).resolve().parent.parent
+STATE_TABLE = "ingest_state"
+STATE_FILE = project_root / "data" / "ingest_state.json"
+LEGACY_FILE = project_root / "data" / "last_timestamps.json"
+
+
+# === Postgres store ===
+def create_state_table(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            symbol TEXT NOT NULL,
+            timeframe TEXT NOT NULL,
+            last_ts TIMESTAMP,
+            row_count BIGINT NOT NULL DEFAULT 0,
+            last_run_at TIMESTAMP,
+            last_status TEXT,
+            last_error TEXT,
+            PRIMARY KEY (symbol, timeframe)
+        );
+    """)
+
+
+def _bootstrap(cur, symbol, timeframe, table):
+    "One-time scan of an existing table (or the unified candles table) to seed its state row"
+    if table is None:
+        from candle_store import CANDLES_TABLE
+        cur.execute(f"SELECT MAX(ts), COUNT(*) FROM {CANDLES_TABLE} WHERE symbol = %s AND timeframe = %s;",
+                    (symbol, timeframe))
+    else:
+        cur.execute(f"SELECT MAX(datetime), COUNT(*) FROM {table};")
+    last_ts, row_count = cur.fetchone()
+    cur.execute(f"""
+        INSERT INTO {STATE_TABLE} (symbol, timeframe, last_ts, row_count)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (symbol, timeframe) DO NOTHING;
+    """, (symbol, timeframe, last_ts, row_count))
+
+
+def get_state(cur, symbol, timeframe, table=None):
+    """State row as a dict (last_ts, row_count, last_run_at, last_status, last_error).
+    Seeds it from `table` (None = unified candles table) the first time a series is seen."""
+    query = f"""
+        SELECT last_ts, row_count, last_run_at, last_status, last_error
+        FROM {STATE_TABLE} WHERE symbol = %s AND timeframe = %s;
+    """
+    cur.execute(query, (symbol, timeframe))
+    row = cur.fetchone()
+    if row is None:
+        _bootstrap(cur, symbol, timeframe, table)
+        cur.execute(query, (symbol, timeframe))
+        row = cur.fetchone()
+    return dict(zip(["last_ts", "row_count", "last_run_at", "last_status", "last_error"], row))
+
+
+def record_insert(cur, symbol, timeframe, rows, last_ts):
+    "Add `rows` new candles ending at `last_ts` (call inside the inserting transaction)"
+    cur.execute(f"""
+        INSERT INTO {STATE_TABLE} (symbol, timeframe, last_ts, row_count, last_run_at, last_status)
+        VALUES (%s, %s, %s, %s, NOW() AT TIME ZONE 'UTC', 'ok')
+        ON CONFLICT (symbol, timeframe) DO UPDATE SET
+            last_ts = GREATEST({STATE_TABLE}.last_ts, EXCLUDED.last_ts),
+            row_count = {STATE_TABLE}.row_count + EXCLUDED.row_count,
+            last_run_at = EXCLUDED.last_run_at,
+            last_status = 'ok',
+            last_error = NULL;
+    """, (symbol, timeframe, last_ts, rows))
+
+
+def set_state(cur, symbol, timeframe, last_ts, row_count):
+    "Overwrite the watermark after a table was rebuilt from scratch (call inside the loading transaction)"
+    cur.execute(f"""
+        INSERT INTO {STATE_TABLE} (symbol, timeframe, last_ts, row_count, last_run_at, last_status)
+        VALUES (%s, %s, %s, %s, NOW() AT TIME ZONE 'UTC', 'ok')
+        ON CONFLICT (symbol, timeframe) DO UPDATE SET
+            last_ts = EXCLUDED.last_ts,
+            row_count = EXCLUDED.row_count,
+            last_run_at = EXCLUDED.last_run_at,
+            last_status = 'ok',
+            last_error = NULL;
+    """, (symbol, timeframe, last_ts, row_count))
+
+
+def reset_state(cur, symbol=None, timeframe=None):
+    "Forget a series' watermark (all of them without arguments); get_state() re-seeds it from the table"
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (STATE_TABLE,))
+    if not cur.fetchone()[0]:
+        return
+    if symbol is None:
+        cur.execute(f"DELETE FROM {STATE_TABLE};")
+    else:
+        cur.execute(f"DELETE FROM {STATE_TABLE} WHERE symbol = %s AND timeframe = %s;", (symbol, timeframe))
+
+
+def record_run(cur, symbol, timeframe, status, error=None):
+    "Mark a run's outcome without touching the watermark (e.g. 'error')"
+    cur.execute(f"""
+        INSERT INTO {STATE_TABLE} (symbol, timeframe, last_run_at, last_status, last_error)
+        VALUES (%s, %s, NOW() AT TIME ZONE 'UTC', %s, %s)
+        ON CONFLICT (symbol, timeframe) DO UPDATE SET
+            last_run_at = EXCLUDED.last_run_at,
+            last_status = EXCLUDED.last_status,
+            last_error = EXCLUDED.last_error;
+    """, (symbol, timeframe, status, error))
+
+
+# === File store (CSV pipelines) ===
+class FileIngestState:
+    "Same fields as the table, in a JSON file keyed by series id (e.g. BTCUSD-1m)"
+
+    def __init__(self, path=STATE_FILE, legacy_path=LEGACY_FILE):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                self.series = json.load(f)
+        elif legacy_path and Path(legacy_path).exists():
+            with open(legacy_path, "r") as f:
+                self.series = {k.strip(): {"last_ts": v.strip(), "row_count": None}
+                               for k, v in json.load(f).items()}
+            print(f"📥 Imported watermarks from {Path(legacy_path).name}")
+        else:
+            self.series = {}
+
+    def last_ts(self, series_id):
+        entry = self.series.get(series_id)
+        if not entry or not entry.get("last_ts"):
+            return None
+        return datetime.datetime.fromisoformat(entry["last_ts"])
+
+    def set(self, series_id, last_ts, row_count):
+        "Overwrite a series (e.g. after scanning its CSV) and save"
+        with self._lock:
+            self.series[series_id] = {
+                **self.series.get(series_id, {}),
+                "last_ts": last_ts.isoformat() if last_ts is not None else None,
+                "row_count": row_count,
+            }
+            self._save()
+
+    def record_insert(self, series_id, rows, last_ts):
+        with self._lock:
+            entry = self.series.setdefault(series_id, {"last_ts": None, "row_count": None})  # count unknown until a scan
+            if last_ts is not None and (entry["last_ts"] is None or last_ts.isoformat() > entry["last_ts"]):
+                entry["last_ts"] = last_ts.isoformat()
+            if entry.get("row_count") is not None:
+                entry["row_count"] += rows
+            entry.update(last_run_at=datetime.datetime.utcnow().isoformat(), last_status="ok", last_error=None)
+            self._save()
+
+    def record_run(self, series_id, status, error=None):
+        with self._lock:
+            entry = self.series.setdefault(series_id, {"last_ts": None, "row_count": None})
+            entry.update(last_run_at=datetime.datetime.utcnow().isoformat(), last_status=status, last_error=error)
+            self._save()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.series, f, indent=2)
+        os.replace(tmp, self.path)  # a crash never leaves a half-written state file
@@ -0,0 +1,122 @@
+'''
+Finds the first real candle for a product so backfills don't walk years of empty
+pre-listing windows (e.g. TAO-USD listed long after 2017).
+
+Works on daily candles in 300-day windows going back from today:
+  1. exponential probe (1, 2, 4, 8... windows back) until a window comes back empty
+  2. binary search between the last window with data and that empty one
+  3. the earliest candle in the oldest non-empty window is the listing date
+
+About 10 requests per product, cached in data/listing_dates.json. Only a search where every
+probe succeeded is cached; if one fails, get_listing_date returns None and the next run retries.
+
+Usage:
+    from listing_date import get_listing_date
+    first_dt = get_listing_date("TAO-USD")   # naive UTC datetime at 00:00, or None
+'''
+
+# ===== Imports =====
+import datetime
+import json
+import threading
+import time
+from pathlib import Path
+from async_fetcher import iter_window_chunks
+from candle_decoder import EMPTY
+
+# === CONFIG ===
+project_root = Path(__file__).resolve().parent.parent
+LISTING_CACHE_FILE = project_root / "data" / "listing_dates.json"
+DAY = 86400
+WINDOW_SECONDS = 300 * DAY  # one request worth of daily candles
+EARLIEST_EXCHANGE_TS = int(datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+_cache_lock = threading.Lock()  # orchestrator workers may discover several products at once
+
+
+def _window_candles(symbol, end_ts, k):
+    """Daily candles in the k-th 300-day window before end_ts.
+    Raises if the request itself failed, so a failed probe is never mistaken for a not-listed-yet window"""
+    start = max(end_ts - (k + 1) * WINDOW_SECONDS, EARLIEST_EXCHANGE_TS)
+    end = end_ts - k * WINDOW_SECONDS
+    if end <= start:
+        return EMPTY
+    (_, candles), = iter_window_chunks(symbol, DAY, [(start, end)], max_in_flight=1)
+    if candles is None:
+        raise RuntimeError(f"probe {datetime.datetime.utcfromtimestamp(start):%Y-%m-%d} → "
+                           f"{datetime.datetime.utcfromtimestamp(end):%Y-%m-%d} failed")
+    return candles
+
+
+def discover_first_candle(symbol):
+    "Epoch seconds of the first daily candle, or None if the product has no candles"
+    end_ts = int(time.time()) // DAY * DAY + DAY
+    max_k = (end_ts - EARLIEST_EXCHANGE_TS) // WINDOW_SECONDS  # last window index worth probing
+
+    found = {0: _window_candles(symbol, end_ts, 0)}
+    if not len(found[0]):
+        return None
+
+    # === 1️⃣ Exponential probe back in time ===
+    has_data, empty = 0, None
+    k = 1
+    while k <= max_k:
+        found[k] = _window_candles(symbol, end_ts, k)
+        if not len(found[k]):
+            empty = k
+            break
+        has_data = k
+        k *= 2
+    if empty is None:
+        empty = max_k + 1
+        if has_data != max_k:
+            found[max_k] = _window_candles(symbol, end_ts, max_k)
+            if len(found[max_k]):
+                has_data = max_k
+            else:
+                empty = max_k
+
+    # === 2️⃣ Binary search for the oldest window with data ===
+    while empty - has_data > 1:
+        mid = (has_data + empty) // 2
+        found[mid] = _window_candles(symbol, end_ts, mid)
+        if len(found[mid]):
+            has_data = mid
+        else:
+            empty = mid
+
+    # === 3️⃣ Earliest candle in that window ===
+    return int(found[has_data][:, 0].min())
+
+
+def load_cache():
+    if LISTING_CACHE_FILE.exists():
+        with open(LISTING_CACHE_FILE, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def get_listing_date(symbol, refresh=False):
+    "Cached listing date (naive UTC datetime) for a product, or None if it can't be found"
+    cache = load_cache()
+    if symbol in cache and not refresh:
+        return datetime.datetime.fromisoformat(cache[symbol])
+
+    print(f"🔭 Discovering first candle for {symbol}...")
+    try:
+        first_ts = discover_first_candle(symbol)
+    except Exception as e:
+        print(f"⚠️ Listing date discovery failed for {symbol}: {e}")
+        return None
+    if first_ts is None:
+        print(f"⚠️ No candles found for {symbol}")
+        return None
+
+    first_dt = datetime.datetime.utcfromtimestamp(first_ts)
+    with _cache_lock:
+        cache = load_cache()
+        cache[symbol] = first_dt.isoformat()
+        LISTING_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(LISTING_CACHE_FILE, "w") as f:
+            json.dump(cache, f, indent=2)
+    print(f"📅 {symbol} first candle: {first_dt}")
+    return first_dt
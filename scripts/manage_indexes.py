@@ -0,0 +1,125 @@
+'''
+Index management for the append-only candle tables.
+
+Candles are inserted in time order, so on top of the primary key B-tree:
+  - BRIN on datetime for the big 1m / 5m tables — a few KB that prunes range scans to the right pages
+  - covering B-tree (datetime) INCLUDE (open, high, low, close, volume) for the dashboard's
+    `SELECT datetime, open, ... WHERE datetime BETWEEN` reads → index-only scans
+  - VACUUM ANALYZE after bulk loads (fresh stats + visibility map, which index-only scans need),
+    and CLUSTER on the primary key when a table's physical order has drifted from time order
+
+    python scripts/manage_indexes.py            # create missing indexes + maintain every table
+    python scripts/manage_indexes.py create     # indexes only
+    python scripts/manage_indexes.py maintain   # VACUUM ANALYZE / CLUSTER only
+
+Which timeframes get which index: INDEX_BRIN_TIMEFRAMES / INDEX_COVERING_TIMEFRAMES in .env.
+'''
+
+# ===== Imports =====
+import os
+import sys
+import time
+from candle_store import CANDLES_TABLE, TIMEFRAMES
+from db_utils import connect
+
+# === Fix Windows Unicode encoding for emojis ===
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+# === CONFIG ===
+BRIN_TIMEFRAMES = os.getenv("INDEX_BRIN_TIMEFRAMES", "1m,5m").split(",")
+COVERING_TIMEFRAMES = os.getenv("INDEX_COVERING_TIMEFRAMES", "5m,15m,1h,6h,1d").split(",")
+BRIN_PAGES_PER_RANGE = 32
+CLUSTER_MIN_CORRELATION = 0.95  # re-CLUSTER when datetime order vs. physical order drops below this
+
+
+def ensure_indexes(cur, table, timeframe):
+    "Create the BRIN / covering indexes a {pair}_{tf} table should have. Returns their names."
+    created = []
+    if timeframe in BRIN_TIMEFRAMES:
+        cur.execute(f"""
+            CREATE INDEX IF NOT EXISTS {table}_datetime_brin ON {table}
+            USING BRIN (datetime) WITH (pages_per_range = {BRIN_PAGES_PER_RANGE});
+        """)
+        created.append(f"{table}_datetime_brin")
+    if timeframe in COVERING_TIMEFRAMES:
+        cur.execute(f"""
+            CREATE INDEX IF NOT EXISTS {table}_datetime_covering ON {table}
+            (datetime) INCLUDE (open, high, low, close, volume);
+        """)
+        created.append(f"{table}_datetime_covering")
+    return created
+
+
+def ensure_unified_indexes(cur):
+    "Same idea for the partitioned candles table (indexes cascade to every partition)"
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {CANDLES_TABLE}_ts_brin ON {CANDLES_TABLE}
+        USING BRIN (ts) WITH (pages_per_range = {BRIN_PAGES_PER_RANGE});
+    """)
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS {CANDLES_TABLE}_series_covering ON {CANDLES_TABLE}
+        (symbol, timeframe, ts) INCLUDE (open, high, low, close, volume);
+    """)
+
+
+def time_correlation(cur, table, column="datetime"):
+    "Planner's estimate of how well physical row order follows time order (1.0 = perfectly)"
+    cur.execute("""
+        SELECT correlation FROM pg_stats
+        WHERE schemaname = 'public' AND tablename = %s AND attname = %s;
+    """, (table, column))
+    row = cur.fetchone()
+    return row[0] if row and row[0] is not None else 1.0
+
+
+def maintain(cur, table):
+    "VACUUM ANALYZE, and CLUSTER on the primary key if rows are no longer stored in time order"
+    cur.execute(f"VACUUM (ANALYZE) {table};")
+    correlation = time_correlation(cur, table)
+    if correlation < CLUSTER_MIN_CORRELATION:
+        print(f"🧹 {table}: correlation {correlation:.2f} → CLUSTER")
+        cur.execute(f"CLUSTER {table} USING {table}_pkey;")
+        cur.execute(f"VACUUM (ANALYZE) {table};")
+
+
+def candle_tables(cur):
+    cur.execute("""
+        SELECT table_name FROM information_schema.tables
+        WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
+          AND table_name ~ '^[a-z0-9]+_[0-9]+[mhd]$'
+        ORDER BY table_name;
+    """)
+    return [t for (t,) in cur.fetchall() if not t.startswith(CANDLES_TABLE) and t.split('_')[1] in TIMEFRAMES]
+
+
+def unified_exists(cur):
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (CANDLES_TABLE,))
+    return cur.fetchone()[0]
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else "all"
+    conn = connect()
+    cur = conn.cursor()
+    try:
+        for table in candle_tables(cur):
+            started = time.time()
+            if mode in ("all", "create"):
+                created = ensure_indexes(cur, table, table.split('_')[1])
+                print(f"📇 {table}: {', '.join(created) or 'primary key only'}")
+            if mode in ("all", "maintain"):
+                maintain(cur, table)
+            print(f"✅ {table} done ({time.time() - started:.1f}s)")
+
+        if unified_exists(cur):
+            if mode in ("all", "create"):
+                ensure_unified_indexes(cur)
+            if mode in ("all", "maintain"):
+                cur.execute(f"VACUUM (ANALYZE) {CANDLES_TABLE};")  # CLUSTER isn't supported on partitioned tables
+            print(f"✅ {CANDLES_TABLE} done")
+    finally:
+        cur.close()
+        conn.close()
+        print("🔑 DB connection closed.")
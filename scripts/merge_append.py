@@ -3,18 +3,30 @@ This script checks and merges new data files with our existing historical data.
 It makes sure we only append new timestampes, deduplicates, and saves the results back to the historical files.
 If there are no new timestamps, it skips the merge for that pair.
 It also verifies the frequency of the timestamps and provides a final summary of merged and skipped pairs.
+Historical files can be CSV or Parquet (see historical_store.py); each is written back in its own format.
+Partitioned series (historical/BTCUSD-1m/2025-06.parquet) only read and rewrite the partitions the new
+rows fall into, so a daily merge costs about the size of one month, not the whole history.
+Each merge adds its new rows to the series' row_count in data/ingest_state.json (see ingest_state.py).
 '''
 
 
+import os
 import pandas as pd
 from pathlib import Path
+from historical_store import (
+    find_historical, merge_sorted_tail, partition_keys, read_historical, write_historical,
+)
+from ingest_state import FileIngestState
 
 # === CONFIG ===
 # Always resolve project root: this works even if the script is in /scripts
 project_root = Path(__file__).resolve().parent.parent
 
-append_dir = project_root / "data" / "append"
-historical_dir = project_root / "data" / "historical"
+data_dir = Path(os.getenv("DATA_DIR", project_root / "data"))  # override for tests / benchmarks
+
+append_dir = data_dir / "append"
+historical_dir = data_dir / "historical"
+state = FileIngestState(data_dir / "ingest_state.json", legacy_path=data_dir / "last_timestamps.json")
 
 # For final summary:
 merged_pairs = []
@@ -25,9 +37,9 @@ for new_data_file in append_dir.glob("*=new-data.csv"):
     pair_timeframe = new_data_file.stem.split('=')[0]  # e.g., BTCUSD-1d
 
     # Find the corresponding historical file
-    hist_file = historical_dir / f"{pair_timeframe}=historical-data.csv"
+    hist_file = find_historical(pair_timeframe, historical_dir)
 
-    if not hist_file.exists():
+    if hist_file is None:
         print(f"❌ Could not find historical file for: {pair_timeframe}")
         skipped_pairs.append(pair_timeframe)
         continue
@@ -36,16 +48,19 @@ for new_data_file in append_dir.glob("*=new-data.csv"):
     print(f"📂 Historical: {hist_file.name}")
     print(f"📂 New:        {new_data_file.name}")
 
-    # Load both
-    df_hist = pd.read_csv(hist_file, index_col='datetime', parse_dates=True)
+    # Load both (partitioned: only the partitions the new rows land in)
     df_new = pd.read_csv(new_data_file, index_col='datetime', parse_dates=True)
+    partitions = None
+    if hist_file.is_dir():
+        partitions = sorted(set(partition_keys(df_new.index, pair_timeframe.split('-')[1])))
+        print(f"🗂️  Partitions touched: {', '.join(partitions)}")
+    df_hist = read_historical(hist_file, partitions=partitions)
 
-    print(f"✅ Historical rows: {len(df_hist)}")
+    print(f"✅ Historical rows: {len(df_hist)}{' (touched partitions)' if partitions else ''}")
     print(f"✅ New rows:        {len(df_new)}")
 
-    # === Compute truly new timestamps
-    only_new = df_new[~df_new.index.isin(df_hist.index)]
-    num_new_unique = len(only_new)
+    # === Sorted tail merge: binary-search the overlap, dedup only there, append
+    df_merged, num_new_unique, seam = merge_sorted_tail(df_hist, df_new)
 
     if num_new_unique == 0:
         print(f"⚠️  No NEW unique timestamps found — SKIPPING merge/save for this pair.")
@@ -54,26 +69,22 @@ for new_data_file in append_dir.glob("*=new-data.csv"):
     else:
         print(f"➕ Newly unique timestamps in new data: {num_new_unique}")
 
-    # === Merge: only hist + truly new
-    df_merged = pd.concat([df_hist, only_new])
-    print(f"🔍 Combined before deduplication: {len(df_merged)} rows")
-
-    # Drop duplicates (safe)
-    df_merged = df_merged[~df_merged.index.duplicated(keep='last')]
-    df_merged = df_merged.sort_index()
-    print(f"✨ After deduplication: {len(df_merged)} rows")
+    print(f"🔍 Overlap with history: {len(df_hist) - seam} rows (the only rows deduplicated against)")
+    print(f"✨ After merge: {len(df_merged)} rows")
 
-    # Range checks
-    print(f"📅 Historical: {df_hist.index.min()} → {df_hist.index.max()}")
+    # Range checks (both sides are sorted → first / last row)
+    if len(df_hist):
+        print(f"📅 Historical: {df_hist.index[0]} → {df_hist.index[-1]}")
     print(f"📅 New:        {df_new.index.min()} → {df_new.index.max()}")
-    print(f"📅 Final:      {df_merged.index.min()} → {df_merged.index.max()}")
+    print(f"📅 Final:      {df_merged.index[0]} → {df_merged.index[-1]}")
 
-    # Verify frequency
+    # Verify frequency across the seam and the new rows (repair_gaps.py scans the full history)
     try:
-        freq = pd.infer_freq(df_merged.index)
+        window = df_merged.index[max(seam - 1, 0):]
+        freq = pd.infer_freq(window)
         if freq:
-            expected = pd.date_range(df_merged.index.min(), df_merged.index.max(), freq=freq)
-            missing = expected.difference(df_merged.index)
+            expected = pd.date_range(window[0], window[-1], freq=freq)
+            missing = expected.difference(window)
             if missing.empty:
                 print(f"✅ No missing timestamps detected. Frequency: {freq}")
             else:
@@ -84,14 +95,17 @@ for new_data_file in append_dir.glob("*=new-data.csv"):
         print(f"⚠️  Could not check frequency: {e}")
 
     # === Save back to historical ===
-    df_merged.to_csv(hist_file)
-    print(f"💾 Merged + deduped data saved to: {hist_file.name}")
+    written = write_historical(df_merged, hist_file)
+    print(f"💾 Merged + deduped data saved to: {', '.join(f.name for f in written)}")
 
     # Sanity check
-    df_check = pd.read_csv(hist_file, index_col='datetime', parse_dates=True)
+    df_check = read_historical(hist_file, columns=[], partitions=partitions)  # row count only needs the index
     assert len(df_check) == len(df_merged), "Saved file does not match merged DataFrame!"
     print(f"✅ Verified saved version: {len(df_check)} rows match in-memory merge.")
 
+    # The fetcher already advanced last_ts; the rows only count once they're in the history
+    state.record_insert(pair_timeframe, num_new_unique, df_merged.index[-1].to_pydatetime())
+
     merged_pairs.append(pair_timeframe)
 
 # === FINAL SUMMARY ===
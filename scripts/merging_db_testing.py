@@ -4,6 +4,8 @@ import psycopg2
 from dotenv import load_dotenv
 import os
 from pathlib import Path
+from db_utils import promote_raw, transaction
+from ingest_state import create_state_table, get_state, record_insert
 
 # === Load .env ===
 project_root = Path(__file__).resolve().parent.parent
@@ -31,33 +33,24 @@ try:
     print(f"✅ Connected to database {DB_NAME}")
 
     # === PARAMETERS ===
+    symbol, timeframe = "TAO-USD", "1d"
     historical_table = "taousd_1d"
     raw_table = "taousd_1d_raw"
 
-    # === Step B1. Get latest datetime in historical table ===
-    cur.execute(f"SELECT MAX(datetime) FROM {historical_table};")
-    latest_hist = cur.fetchone()[0]
+    # === Step B1. Get latest datetime in historical table (ingest_state watermark) ===
+    create_state_table(cur)
+    latest_hist = get_state(cur, symbol, timeframe, table=historical_table)["last_ts"]
 
     if latest_hist is None:
         print("⚠️ Historical table is empty. Will insert all raw data.")
         latest_hist = '1970-01-01'  # dummy old date if table is empty
 
-    # === Step B2. Insert only newer rows from raw to historical ===
-    insert_query = f"""
-    INSERT INTO {historical_table} (datetime, open, high, low, close, volume)
-    SELECT datetime, open, high, low, close, volume
-    FROM {raw_table}
-    WHERE datetime > %s
-    ON CONFLICT (datetime) DO NOTHING;
-    """
-
-    cur.execute(insert_query, (latest_hist,))
-    rows_inserted = cur.rowcount
+    # === Step B2. Insert only newer rows from raw to historical, then C. purge raw ===
+    with transaction(cur):  # insert + purge + watermark commit together
+        rows_inserted, last_ts = promote_raw(cur, historical_table, raw_table, latest_hist, with_last_ts=True)
+        record_insert(cur, symbol, timeframe, rows_inserted, last_ts)
 
     print(f"✅ Inserted {rows_inserted} new rows from {raw_table} to {historical_table}")
-
-    # === Step C. Purge raw table ===
-    cur.execute(f"TRUNCATE TABLE {raw_table};")
     print(f"🗑️ Purged table {raw_table}")
 
 except Exception as e:
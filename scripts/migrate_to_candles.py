@@ -0,0 +1,86 @@
+'''
+Moves the per-pair tables (btcusd_1m, taousd_1d, ...) into the unified partitioned `candles` table.
+
+For every {pair}_{tf} table: create the partitions it needs, copy its rows in with one
+INSERT ... SELECT, and check the row counts match. _raw staging tables are left alone.
+
+    python scripts/migrate_to_candles.py                    # copy, keep the old tables
+    DROP_LEGACY=true python scripts/migrate_to_candles.py   # also drop each table once verified
+
+DROP_LEGACY only goes ahead with CANDLE_STORE=unified in .env: the pipelines and both dashboards
+(crypto_dashboard.py, btc_dashboardV2.py) read the per-pair tables until that's set.
+
+Safe to re-run: rows already in `candles` are skipped (ON CONFLICT DO NOTHING).
+'''
+
+# ===== Imports =====
+import os
+import sys
+import time
+from candle_store import (
+    CANDLE_STORE, CANDLES_TABLE, TIMEFRAMES, create_candles_table, insert_from_table, symbol_from_pair,
+)
+from db_utils import connect
+
+# === Fix Windows Unicode encoding for emojis ===
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+# === CONFIG ===
+DROP_LEGACY = os.getenv("DROP_LEGACY", "False").lower() == "true"
+
+
+def legacy_tables(cur):
+    cur.execute("""
+        SELECT table_name FROM information_schema.tables
+        WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
+          AND table_name ~ '^[a-z0-9]+_[0-9]+[mhd]$'
+        ORDER BY table_name;
+    """)
+    return [t for (t,) in cur.fetchall() if t.split('_')[1] in TIMEFRAMES and not t.startswith(CANDLES_TABLE)]
+
+
+def migrate_table(cur, table):
+    pair, timeframe = table.split('_')
+    symbol = symbol_from_pair(pair)
+    started = time.time()
+
+    inserted = insert_from_table(cur, symbol, timeframe, table)
+
+    cur.execute(f"SELECT COUNT(*) FROM {table};")
+    expected = cur.fetchone()[0]
+    cur.execute(f"SELECT COUNT(*) FROM {CANDLES_TABLE} WHERE symbol = %s AND timeframe = %s;",
+                (symbol, timeframe))
+    migrated = cur.fetchone()[0]
+    print(f"📦 {table} → {symbol} {timeframe}: {inserted} new rows, "
+          f"{migrated}/{expected} present ({time.time() - started:.1f}s)")
+    return migrated >= expected
+
+
+if __name__ == "__main__":
+    if DROP_LEGACY and CANDLE_STORE != "unified":
+        print("❌ DROP_LEGACY needs CANDLE_STORE=unified — the pipelines and dashboards still read the per-pair tables")
+        sys.exit(1)
+
+    conn = connect()
+    cur = conn.cursor()
+    try:
+        create_candles_table(cur)
+        tables = legacy_tables(cur)
+        print(f"🚚 Migrating {len(tables)} tables into {CANDLES_TABLE}")
+
+        for table in tables:
+            if not migrate_table(cur, table):
+                print(f"❌ Row count mismatch for {table} — keeping it")
+                continue
+            if DROP_LEGACY:
+                cur.execute(f"DROP TABLE {table};")
+                print(f"🗑️  Dropped {table}")
+
+        cur.execute(f"ANALYZE {CANDLES_TABLE};")
+        print(f"\n🎉 Migration complete. DROP_LEGACY = {DROP_LEGACY}")
+    finally:
+        cur.close()
+        conn.close()
+        print("🔑 DB connection closed.")
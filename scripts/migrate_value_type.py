@@ -0,0 +1,79 @@
+'''
+Converts the OHLCV columns of every candle table in place to CANDLE_VALUE_TYPE
+(double = DOUBLE PRECISION, numeric = NUMERIC), and reports the size before / after.
+
+Covers the per-pair tables, their _raw tables and the unified `candles` table (ALTER on the
+partitioned parent rewrites every partition). Each table is rewritten once, in one ALTER.
+
+    CANDLE_VALUE_TYPE=double python scripts/migrate_value_type.py
+
+Set CANDLE_VALUE_TYPE=double in .env as well so new tables are created the same way.
+DOUBLE PRECISION keeps ~15 significant digits — plenty for Coinbase prices and sizes.
+'''
+
+# ===== Imports =====
+import sys
+import time
+from candle_store import CANDLES_TABLE
+from db_utils import CANDLE_COLUMNS, VALUE_TYPE, connect
+
+# === Fix Windows Unicode encoding for emojis ===
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+
+def candle_tables(cur):
+    "Top-level candle tables (partitions are handled through their parent)"
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+          AND (c.relname ~ '^[a-z0-9]+_[0-9]+[mhd](_raw)?$' OR c.relname = %s)
+        ORDER BY c.relname;
+    """, (CANDLES_TABLE,))
+    return [t for (t,) in cur.fetchall()]
+
+
+def table_size(cur, table):
+    cur.execute("SELECT COALESCE(SUM(pg_total_relation_size(relid)), 0) FROM pg_partition_tree(%s);", (table,))
+    return cur.fetchone()[0]
+
+
+def needs_change(cur, table):
+    cur.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_name = %s AND column_name = ANY(%s) AND data_type <> %s;
+    """, (table, CANDLE_COLUMNS[1:], VALUE_TYPE.lower()))
+    return cur.fetchone()[0] > 0
+
+
+def convert(cur, table):
+    alters = ", ".join(f"ALTER COLUMN {c} TYPE {VALUE_TYPE} USING {c}::{VALUE_TYPE}" for c in CANDLE_COLUMNS[1:])
+    cur.execute(f"ALTER TABLE {table} {alters};")
+    cur.execute(f"ANALYZE {table};")
+
+
+if __name__ == "__main__":
+    conn = connect()
+    cur = conn.cursor()
+    try:
+        total_before = total_after = 0
+        for table in candle_tables(cur):
+            if not needs_change(cur, table):
+                print(f"⏭️  {table} already {VALUE_TYPE}")
+                continue
+            before = table_size(cur, table)
+            started = time.time()
+            convert(cur, table)
+            after = table_size(cur, table)
+            total_before += before
+            total_after += after
+            print(f"🔧 {table}: {before / 1e6:.1f} MB → {after / 1e6:.1f} MB ({time.time() - started:.1f}s)")
+
+        print(f"\n🎉 Converted to {VALUE_TYPE}: {total_before / 1e6:.1f} MB → {total_after / 1e6:.1f} MB")
+    finally:
+        cur.close()
+        conn.close()
+        print("🔑 DB connection closed.")
@@ -1,21 +1,37 @@
 '''
 Orchestrator v5: Adds BTC, ETH, SOL, TAO orchestration with schema verification, backups, and execution timer.
+
+Pairs run in-process on ORCHESTRATOR_WORKERS threads, sharing one Postgres connection pool,
+one HTTP session and one request pacer (so concurrency never pushes us over the API limit).
+
+Each run has three phases: fetch every pair into its _raw tables (in parallel), promote ALL raw
+tables into history with one set-based statement in one transaction (one commit / WAL flush for
+the whole run instead of one per series, and no half-promoted runs), then derive coarser
+timeframes per pair (in parallel).
 '''
 
 # ===== Imports =====
-import psycopg2
 from dotenv import load_dotenv
 import os
 from pathlib import Path
 import subprocess
 import time
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from candle_store import CANDLE_STORE, CANDLES_TABLE, create_candles_table, promote_many_to_candles
+from db_utils import (
+    VALUE_TYPE_NAMES, close_pool, create_candle_table, create_raw_table, get_pool, pooled_cursor, promote_many,
+    transaction,
+)
+from ingest_state import create_state_table, get_state, record_insert, record_run
+from get_new_rawdb_candles import fetch_new_data
+from http_client import close_session
+from resample_candles import DERIVED_TIMEFRAMES, resample_from_1m, resample_in_candles, verify_against_api
 
 # === Fix Windows Unicode encoding for emojis ===
 if sys.platform == "win32":
-    import io
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
 
 # === Start timer ===
 start_time = time.time()
@@ -27,23 +43,27 @@ load_dotenv(env_path)
 
 # === DB credentials ===
 DB_NAME = os.getenv("DB_NAME")
-DB_USER = os.getenv("DB_USER")
-DB_PASSWORD = os.getenv("DB_PASSWORD")
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
 
 # === CONFIG ===
 PAIRS = ["TAO-USD", "BTC-USD", "ETH-USD", "SOL-USD"]
 TIMEFRAMES = ["1d", "6h", "1h", "5m", "1m"]
+WORKERS = int(os.getenv("ORCHESTRATOR_WORKERS", "2"))  # pairs processed at the same time
+UNIFIED = CANDLE_STORE == "unified"  # CANDLE_STORE=unified → one partitioned `candles` table (candle_store.py)
+
+# Only 1m comes from the API; coarser timeframes are built locally from the 1m table.
+# Set DERIVE_FROM_1M=false to go back to fetching every timeframe from Coinbase.
+DERIVE_FROM_1M = os.getenv("DERIVE_FROM_1M", "true").lower() == "true"
+VERIFY_SAMPLE = int(os.getenv("VERIFY_SAMPLE", "0"))  # last N derived candles to check vs API (0 = off)
 
-expected_columns_types = [
-    ('datetime', 'timestamp without time zone'),
-    ('open', 'numeric'),
-    ('high', 'numeric'),
-    ('low', 'numeric'),
-    ('close', 'numeric'),
-    ('volume', 'numeric')
-]
+if DERIVE_FROM_1M:
+    FETCH_TIMEFRAMES = ["1m"]
+    LOCAL_TIMEFRAMES = [tf for tf in TIMEFRAMES if tf in DERIVED_TIMEFRAMES]
+else:
+    FETCH_TIMEFRAMES = TIMEFRAMES
+    LOCAL_TIMEFRAMES = []
+
+expected_columns = ['datetime', 'open', 'high', 'low', 'close', 'volume']
+expected_types = [['timestamp without time zone']] + [VALUE_TYPE_NAMES] * 5  # NUMERIC or DOUBLE PRECISION
 
 # === Define pre-run table check ===
 def pre_run_check(cur, table_name):
@@ -57,16 +77,7 @@ def pre_run_check(cur, table_name):
 
     if not exists:
         print(f"⚠️ Table {table_name} missing. Creating it.")
-        cur.execute(f"""
-            CREATE TABLE {table_name} (
-                datetime TIMESTAMP PRIMARY KEY,
-                open NUMERIC,
-                high NUMERIC,
-                low NUMERIC,
-                close NUMERIC,
-                volume NUMERIC
-            );
-        """)
+        create_candle_table(cur, table_name)
         return True
 
     cur.execute("""
@@ -77,93 +88,169 @@ def pre_run_check(cur, table_name):
     """, (table_name,))
     columns_types = cur.fetchall()
 
-    if columns_types != expected_columns_types:
+    if ([c for c, _ in columns_types] != expected_columns
+            or any(t not in allowed for (_, t), allowed in zip(columns_types, expected_types))):
         print(f"❌ Schema/type mismatch in {table_name}. Found: {columns_types}")
         return False
 
     print(f"✅ Schema verified for {table_name}")
     return True
 
-# === Connect to Postgres ===
+# === Fetch one API timeframe into its raw table; returns what promote_all needs ===
+def fetch_timeframe(cur, pair, tf):
+    symbol_clean = pair.replace('-', '').lower()
+    historical_table = f"{symbol_clean}_{tf}"
+    raw_table = f"{symbol_clean}_{tf}_raw"
+
+    print(f"\n🔎 Processing {pair} {tf}...")
+
+    if not UNIFIED and not pre_run_check(cur, historical_table):
+        return None
+    create_raw_table(cur, raw_table)  # UNLOGGED staging; recreated here if missing after a crash / manual drop
+    if not pre_run_check(cur, raw_table):
+        return None
+
+    # Watermark + row count come from ingest_state (no MAX / COUNT scans)
+    state = get_state(cur, pair, tf, table=None if UNIFIED else historical_table)
+    prev_count = state["row_count"]
+    print(f"🔢 Previous row count: {prev_count}")
+
+    latest_hist = state["last_ts"]
+
+    if latest_hist is None:
+        print("⚠️ Historical table empty, setting earliest date.")
+        latest_hist = '2015-01-01'
+    else:
+        print(f"🔍 Latest datetime in historical: {latest_hist}")
+
+    print(f"🚀 Fetching {pair} {tf}...")
+    fetch_new_data(pair, tf, cur)
+    return {"pair": pair, "tf": tf, "historical_table": historical_table, "raw_table": raw_table,
+            "since": latest_hist, "prev_count": prev_count}
+
+# === Promote every fetched raw table in ONE transaction (one set-based statement, one commit) ===
+def promote_all(batches):
+    with pooled_cursor() as cur:
+        try:
+            with transaction(cur):  # candles + watermarks for every series commit together
+                if UNIFIED:
+                    results = promote_many_to_candles(
+                        cur, [(b["pair"], b["tf"], b["raw_table"], b["since"]) for b in batches])
+                else:
+                    results = promote_many(
+                        cur, [(b["historical_table"], b["raw_table"], b["since"]) for b in batches])
+                for b, (rows_inserted, last_ts) in zip(batches, results):
+                    record_insert(cur, b["pair"], b["tf"], rows_inserted, last_ts)
+        except Exception as e:
+            for b in batches:
+                record_run(cur, b["pair"], b["tf"], "error", str(e))
+            raise
+
+        for b, (rows_inserted, _) in zip(batches, results):
+            target = f"{CANDLES_TABLE} ({b['pair']} {b['tf']})" if UNIFIED else b["historical_table"]
+            if rows_inserted and not UNIFIED:
+                cur.execute(f"ANALYZE {target};")  # keep planner stats current (see manage_indexes.py)
+            print(f"✅ Inserted {rows_inserted} new rows from {b['raw_table']} to {target} "
+                  f"(📊 {b['prev_count']} → {b['prev_count'] + rows_inserted})")
+        print(f"🗑️ Purged {len(batches)} raw tables")
+
+# === Derive a coarser timeframe from 1m ===
+def derive_timeframe(cur, pair, tf):
+    symbol_clean = pair.replace('-', '').lower()
+    historical_table = f"{symbol_clean}_{tf}"
+
+    print(f"\n🧮 Deriving {pair} {tf} from 1m...")
+
+    if not UNIFIED and not pre_run_check(cur, historical_table):
+        return
+    get_state(cur, pair, tf, table=None if UNIFIED else historical_table)  # seeds the state row once
+
+    with transaction(cur):
+        if UNIFIED:
+            new_rows, last_ts = resample_in_candles(cur, pair, tf, with_last_ts=True)
+            historical_table = f"{CANDLES_TABLE} ({pair} {tf})"
+        else:
+            new_rows, last_ts = resample_from_1m(cur, symbol_clean, tf, with_last_ts=True)
+        record_insert(cur, pair, tf, new_rows, last_ts)
+    print(f"✅ Added {new_rows} new {tf} candles to {historical_table}")
+
+    if VERIFY_SAMPLE:
+        verify_against_api(cur, pair, tf, VERIFY_SAMPLE)
+
+# === Per-pair phases (run on the worker threads) ===
+def fetch_pair(pair):
+    batches = []
+    with pooled_cursor() as cur:
+        for tf in FETCH_TIMEFRAMES:
+            try:
+                batch = fetch_timeframe(cur, pair, tf)
+            except Exception as e:
+                record_run(cur, pair, tf, "error", str(e))
+                raise
+            if batch:
+                batches.append(batch)
+    return batches
+
+def derive_pair(pair):
+    with pooled_cursor() as cur:
+        for tf in LOCAL_TIMEFRAMES:
+            try:
+                derive_timeframe(cur, pair, tf)
+            except Exception as e:
+                record_run(cur, pair, tf, "error", str(e))
+                raise
+
+def run_pairs(step, pairs, failed):
+    "Run step(pair) for every pair on the worker pool; returns {pair: result}, failures go into `failed`"
+    results = {}
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        futures = {executor.submit(step, pair): pair for pair in pairs}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                print(f"❌ {futures[future]} failed: {e}")
+                failed.append(futures[future])
+    return results
+
+# === Run all pairs ===
 try:
-    conn = psycopg2.connect(
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT
-    )
-    conn.autocommit = True
-    cur = conn.cursor()
-    print(f"✅ Connected to database {DB_NAME}")
+    get_pool(WORKERS + 1)
+    print(f"✅ Connected to database {DB_NAME} ({WORKERS} workers)")
+    with pooled_cursor() as cur:
+        create_state_table(cur)
+        if UNIFIED:
+            create_candles_table(cur)
 
+    failed = []
+    fetched = run_pairs(fetch_pair, PAIRS, failed)
+
+    batches = [batch for pair in PAIRS for batch in fetched.get(pair, [])]
+    try:
+        promote_all(batches)
+    except Exception as e:
+        print(f"❌ Promotion failed, nothing committed: {e}")
+        failed.extend(fetched)
+
+    ready = [pair for pair in PAIRS if pair not in failed]
+    if LOCAL_TIMEFRAMES:
+        run_pairs(derive_pair, ready, failed)
     for pair in PAIRS:
-        for tf in TIMEFRAMES:
-            symbol_clean = pair.replace('-', '').lower()
-            historical_table = f"{symbol_clean}_{tf}"
-            raw_table = f"{symbol_clean}_{tf}_raw"
-
-            print(f"\n🔎 Processing {pair} {tf}...")
-
-            if not pre_run_check(cur, historical_table):
-                continue
-            if not pre_run_check(cur, raw_table):
-                continue
-
-            cur.execute(f"SELECT COUNT(*) FROM {historical_table};")
-            prev_count = cur.fetchone()[0]
-            print(f"🔢 Previous row count: {prev_count}")
-
-            cur.execute(f"SELECT MAX(datetime) FROM {historical_table};")
-            latest_hist = cur.fetchone()[0]
-
-            if latest_hist is None:
-                print("⚠️ Historical table empty, setting earliest date.")
-                latest_hist = '2015-01-01'
-            else:
-                print(f"🔍 Latest datetime in historical: {latest_hist}")
-
-            print("🚀 Running fetch script...")
-            fetch_env = os.environ.copy()
-            fetch_env["SYMBOL"] = pair
-            fetch_env["TIMEFRAME"] = tf
-
-            subprocess.run(
-                ["python", "scripts/get_new_rawdb_candles.py"],
-                check=True,
-                env=fetch_env
-            )
-
-            insert_query = f"""
-            INSERT INTO {historical_table} (datetime, open, high, low, close, volume)
-            SELECT datetime, open, high, low, close, volume
-            FROM {raw_table}
-            WHERE datetime > %s
-            ON CONFLICT (datetime) DO NOTHING;
-            """
-            cur.execute(insert_query, (latest_hist,))
-            rows_inserted = cur.rowcount
-
-            print(f"✅ Inserted {rows_inserted} new rows from {raw_table} to {historical_table}")
-
-            cur.execute(f"TRUNCATE TABLE {raw_table};")
-            print(f"🗑️ Purged table {raw_table}")
-
-            cur.execute(f"SELECT COUNT(*) FROM {historical_table};")
-            new_count = cur.fetchone()[0]
-            print(f"📊 New row count: {new_count}")
-            print(f"🌟 Rows inserted this run: {new_count - prev_count}")
-
-    subprocess.run(["python", "scripts/db_backup.py"], check=True)
+        if pair not in failed:
+            print(f"🏁 {pair} done")
+
+    if failed:
+        print(f"⚠️ Skipping backup, failed pairs: {', '.join(failed)}")
+    else:
+        subprocess.run(["python", "scripts/db_backup.py"], check=True)
 
 except Exception as e:
     print(f"❌ Error: {e}")
 
 finally:
-    if conn:
-        cur.close()
-        conn.close()
-        print("🔑 DB connection closed.")
+    close_pool()
+    close_session()
+    print("🔑 DB connection closed.")
 
 # === Print total runtime ===
 end_time = time.time()
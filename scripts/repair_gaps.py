@@ -0,0 +1,210 @@
+'''
+Finds missing candles in the historical data and (optionally) refetches exactly those ranges.
+
+1. Scan: every historical file, CSV or Parquet (or Postgres table) is checked for holes, which are saved
+   as intervals in data/gap_index.json (see gap_index.py). With GAP_SOURCE=postgres that's every per-pair
+   table plus every series in the unified candles table (keyed "candles:BTC-USD:1m").
+2. Repair (REPAIR=true): the holes are coalesced into the fewest 300-candle requests,
+   fetched, and merged back in. Holes Coinbase has no candles for are remembered as "empty".
+
+    python scripts/repair_gaps.py                                # scan CSVs only
+    REPAIR=true python scripts/repair_gaps.py                    # scan + repair CSVs
+    GAP_SOURCE=postgres REPAIR=true python scripts/repair_gaps.py
+'''
+
+# ===== Imports =====
+import os
+import sys
+import pandas as pd
+from pathlib import Path
+from dotenv import load_dotenv
+from async_fetcher import iter_window_chunks
+from candle_decoder import candles_to_frame
+from candle_store import CANDLES_TABLE, TIMEFRAMES, symbol_from_pair
+from historical_store import find_historical, list_series, read_historical, write_historical
+from ingest_state import FileIngestState
+from gap_index import (
+    coalesce_windows, count_candles, find_gaps, load_index, record_repair,
+    record_scan, save_index, subtract_intervals,
+)
+
+# === Fix Windows Unicode encoding for emojis ===
+if sys.platform == "win32":
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.stderr.reconfigure(encoding='utf-8')
+
+# === Load .env ===
+project_root = Path(__file__).resolve().parent.parent
+env_path = project_root / ".env"
+load_dotenv(env_path)
+
+# === CONFIG ===
+GAP_SOURCE = os.getenv("GAP_SOURCE", "csv").lower()  # "csv" (data/historical files, CSV or Parquet) or "postgres"
+REPAIR = os.getenv("REPAIR", "False").lower() == "true"
+historical_dir = project_root / "data" / "historical"
+
+
+def timeframe_to_granularity(timeframe):
+    if 'm' in timeframe:
+        return int(''.join([c for c in timeframe if c.isnumeric()])) * 60
+    elif 'h' in timeframe:
+        return int(''.join([c for c in timeframe if c.isnumeric()])) * 3600
+    elif 'd' in timeframe:
+        return int(''.join([c for c in timeframe if c.isnumeric()])) * 86400
+
+
+def intersect(intervals, other):
+    return subtract_intervals(intervals, subtract_intervals(intervals, other))
+
+
+def fetch_gap_candles(symbol, granularity, gaps, fetched):
+    """Yield DataFrames (datetime index, OHLCV) for the coalesced gap windows.
+    Windows the API actually answered are appended to `fetched`; failed ones (None) are not."""
+    windows = coalesce_windows(gaps, granularity)
+    print(f"🧩 {count_candles(gaps, granularity)} missing candles → {len(windows)} requests")
+    for window, candles in iter_window_chunks(symbol, granularity, windows):
+        if candles is None:
+            continue
+        fetched.append(window)
+        if len(candles):
+            yield candles_to_frame(candles)
+
+
+# === CSV source ===
+def scan_csv(hist_file, granularity):
+    df = read_historical(hist_file, columns=[])
+    epochs = df.index.values.astype('datetime64[s]').astype('int64')
+    epochs.sort()
+    return find_gaps(epochs, granularity)
+
+
+def repair_csv(hist_file, symbol, granularity, gaps, fetched):
+    repaired = list(fetch_gap_candles(symbol, granularity, gaps, fetched))
+    if not repaired:
+        return 0
+    df_new = pd.concat(repaired)
+    df_hist = read_historical(hist_file)
+    df_merged = pd.concat([df_hist, df_new])
+    df_merged = df_merged[~df_merged.index.duplicated(keep='first')].sort_index()
+    write_historical(df_merged, hist_file)
+    return len(df_merged) - len(df_hist)
+
+
+def run_csv(index):
+    state = FileIngestState()
+    for series_id in list_series(historical_dir):  # e.g., BTCUSD-1m
+        hist_file = find_historical(series_id, historical_dir)
+        pair, timeframe = series_id.split('-')
+        granularity = timeframe_to_granularity(timeframe)
+
+        print(f"\n🔍 Scanning {hist_file.name}")
+        entry = record_scan(index, series_id, granularity, scan_csv(hist_file, granularity))
+        missing = entry["missing"]
+        print(f"🕳️  {len(missing)} gaps, {count_candles(missing, granularity)} missing candles")
+
+        if REPAIR and missing:
+            fetched = []
+            added = repair_csv(hist_file, symbol_from_pair(pair), granularity, missing, fetched)
+            if added:
+                state.record_insert(series_id, added, None)  # holes lie before last_ts, only the count moves
+            still_missing = intersect(missing, scan_csv(hist_file, granularity))
+            entry = record_repair(index, series_id, still_missing, fetched)
+            print(f"✅ Repaired {added} candles, {count_candles(entry['empty'], granularity)} confirmed empty, "
+                  f"{count_candles(entry['missing'], granularity)} left for the next run")
+
+
+# === Postgres source ===
+def postgres_series(cur):
+    """(gap index key, symbol, timeframe, table) for every per-pair history table, then every series
+    in the unified candles table (table None). candles' own partitions are never scanned as tables."""
+    cur.execute("""
+        SELECT table_name FROM information_schema.tables
+        WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
+          AND table_name ~ '^[a-z0-9]+_[0-9]+[mhd]$'
+        ORDER BY table_name;
+    """)
+    series = [(t, symbol_from_pair(t.split('_')[0]), t.split('_')[1], t)
+              for (t,) in cur.fetchall() if not t.startswith(CANDLES_TABLE) and t.split('_')[1] in TIMEFRAMES]
+
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (CANDLES_TABLE,))
+    if cur.fetchone()[0]:
+        cur.execute(f"SELECT DISTINCT symbol, timeframe FROM {CANDLES_TABLE} ORDER BY symbol, timeframe;")
+        series += [(f"{CANDLES_TABLE}:{symbol}:{tf}", symbol, tf, None) for symbol, tf in cur.fetchall()]
+    return series
+
+
+def scan_table(cur, table, granularity, symbol=None, timeframe=None):
+    "Holes in a per-pair table, or in one series of the candles table when table is None"
+    if table is None:
+        source = f"SELECT ts AS datetime FROM {CANDLES_TABLE} WHERE symbol = %(symbol)s AND timeframe = %(timeframe)s"
+    else:
+        source = f"SELECT datetime FROM {table}"
+    cur.execute(f"""
+        SELECT EXTRACT(EPOCH FROM datetime)::BIGINT, EXTRACT(EPOCH FROM next_dt)::BIGINT
+        FROM (
+            SELECT datetime, LEAD(datetime) OVER (ORDER BY datetime) AS next_dt
+            FROM ({source}) AS series
+        ) AS steps
+        WHERE next_dt - datetime > %(granularity)s * INTERVAL '1 second'
+        ORDER BY datetime;
+    """, {"granularity": granularity, "symbol": symbol, "timeframe": timeframe})
+    return [[int(prev) + granularity, int(nxt)] for prev, nxt in cur.fetchall()]
+
+
+def run_postgres(index):
+    import psycopg2
+    from candle_store import load_candles
+    from db_utils import copy_candles, transaction
+    from ingest_state import create_state_table, get_state, record_insert
+
+    conn = psycopg2.connect(
+        dbname=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT")
+    )
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        create_state_table(cur)
+        for key, symbol, timeframe, table in postgres_series(cur):
+            granularity = timeframe_to_granularity(timeframe)
+
+            print(f"\n🔍 Scanning {table or f'{CANDLES_TABLE} ({symbol} {timeframe})'}")
+            entry = record_scan(index, key, granularity, scan_table(cur, table, granularity, symbol, timeframe))
+            missing = entry["missing"]
+            print(f"🕳️  {len(missing)} gaps, {count_candles(missing, granularity)} missing candles")
+
+            if REPAIR and missing:
+                fetched = []
+                repaired = list(fetch_gap_candles(symbol, granularity, missing, fetched))
+                get_state(cur, symbol, timeframe, table=table)  # seeds the state row before counting on top of it
+                # Straight into the history table (not via PostgresRawSink, which makes tables UNLOGGED),
+                # with its ingest_state row in the same transaction
+                with transaction(cur):
+                    if table is None:
+                        added = sum(load_candles(cur, symbol, timeframe, df) for df in repaired)
+                    else:
+                        added = sum(copy_candles(cur, table, df) for df in repaired)  # ON CONFLICT DO NOTHING
+                    last_ts = max(df.index.max() for df in repaired) if repaired else None
+                    record_insert(cur, symbol, timeframe, added, last_ts)
+                print(f"✅ Inserted {added} rows to {table or CANDLES_TABLE}")
+                still_missing = intersect(missing, scan_table(cur, table, granularity, symbol, timeframe))
+                entry = record_repair(index, key, still_missing, fetched)
+                print(f"✅ {count_candles(entry['empty'], granularity)} candles confirmed empty, "
+                      f"{count_candles(entry['missing'], granularity)} left for the next run")
+    finally:
+        cur.close()
+        conn.close()
+        print("🔑 DB connection closed.")
+
+
+# ==== MAIN RUN ====
+gap_index = load_index()
+if GAP_SOURCE == "postgres":
+    run_postgres(gap_index)
+else:
+    run_csv(gap_index)
+save_index(gap_index)
+print(f"\n💾 Gap index saved. REPAIR = {REPAIR}")
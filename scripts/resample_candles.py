@@ -0,0 +1,172 @@
+'''
+Builds the coarser {pair}_{tf} tables (5m, 1h, 6h, 1d) from the {pair}_1m table in Postgres,
+so the orchestrator only has to hit the Coinbase API for 1m candles.
+
+Aggregation is done in SQL (first open / max high / min low / last close / sum volume),
+bucketed on epoch seconds so 6h and 1d candles line up with Coinbase's UTC boundaries.
+Only buckets from the latest existing coarse candle onwards are rebuilt, so older history
+(e.g. pre-2017 daily candles that 1m does not cover) is left untouched.
+
+resample_in_candles() does the same inside the unified partitioned `candles` table (candle_store.py).
+
+Optionally verify_against_api() pulls the last N coarse candles from Coinbase and compares.
+'''
+
+# ===== Imports =====
+import datetime
+import time
+
+# === CONFIG ===
+TIMEFRAME_SECONDS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "6h": 21600,
+    "1d": 86400,
+}
+DERIVED_TIMEFRAMES = ["5m", "1h", "6h", "1d"]
+VERIFY_TOLERANCE = 0.005  # 0.5% relative difference allowed (volume gets revised by Coinbase)
+
+
+def resample_from_1m(cur, pair, timeframe, with_last_ts=False):
+    """Rebuild {pair}_{timeframe} buckets from {pair}_1m. Returns rows upserted
+    (or (new rows, newest bucket) with with_last_ts=True, for ingest_state)."""
+    source_table = f"{pair}_1m"
+    target_table = f"{pair}_{timeframe}"
+    bucket_seconds = TIMEFRAME_SECONDS[timeframe]
+
+    # Re-aggregate the latest (possibly partial) coarse bucket and everything after it
+    cur.execute(f"SELECT MAX(datetime) FROM {target_table};")
+    since = cur.fetchone()[0]
+    if since is None:
+        since = datetime.datetime(1970, 1, 1)
+
+    cur.execute(f"""
+        WITH upserted AS (
+            INSERT INTO {target_table} (datetime, open, high, low, close, volume)
+            SELECT
+                bucket,
+                (ARRAY_AGG(open ORDER BY datetime ASC))[1],
+                MAX(high),
+                MIN(low),
+                (ARRAY_AGG(close ORDER BY datetime DESC))[1],
+                SUM(volume)
+            FROM (
+                SELECT
+                    TO_TIMESTAMP(FLOOR(EXTRACT(EPOCH FROM datetime) / %(secs)s) * %(secs)s) AT TIME ZONE 'UTC' AS bucket,
+                    datetime, open, high, low, close, volume
+                FROM {source_table}
+                WHERE datetime >= %(since)s
+            ) AS minute_candles
+            GROUP BY bucket
+            ON CONFLICT (datetime) DO UPDATE SET
+                open = EXCLUDED.open,
+                high = EXCLUDED.high,
+                low = EXCLUDED.low,
+                close = EXCLUDED.close,
+                volume = EXCLUDED.volume
+            RETURNING datetime, xmax = 0 AS is_new
+        )
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE is_new), MAX(datetime) FROM upserted;
+    """, {"secs": bucket_seconds, "since": since})
+    upserted, new_rows, last_ts = cur.fetchone()
+    return (new_rows, last_ts) if with_last_ts else upserted
+
+
+def resample_in_candles(cur, symbol, timeframe, with_last_ts=False):
+    "Rebuild a symbol's `timeframe` rows in the unified candles table from its 1m rows (see resample_from_1m)."
+    from candle_store import CANDLES_TABLE, ensure_partitions, latest_ts
+
+    bucket_seconds = TIMEFRAME_SECONDS[timeframe]
+    since = latest_ts(cur, symbol, timeframe) or datetime.datetime(1970, 1, 1)
+    cur.execute(f"SELECT MIN(ts), MAX(ts) FROM {CANDLES_TABLE} WHERE symbol = %s AND timeframe = '1m' AND ts >= %s;",
+                (symbol, since))
+    first, last = cur.fetchone()
+    if first is None:
+        return (0, None) if with_last_ts else 0
+    ensure_partitions(cur, timeframe, first, last)
+
+    cur.execute(f"""
+        WITH upserted AS (
+            INSERT INTO {CANDLES_TABLE} (symbol, timeframe, ts, open, high, low, close, volume)
+            SELECT
+                %(symbol)s,
+                %(timeframe)s,
+                bucket,
+                (ARRAY_AGG(open ORDER BY ts ASC))[1],
+                MAX(high),
+                MIN(low),
+                (ARRAY_AGG(close ORDER BY ts DESC))[1],
+                SUM(volume)
+            FROM (
+                SELECT
+                    TO_TIMESTAMP(FLOOR(EXTRACT(EPOCH FROM ts) / %(secs)s) * %(secs)s) AT TIME ZONE 'UTC' AS bucket,
+                    ts, open, high, low, close, volume
+                FROM {CANDLES_TABLE}
+                WHERE symbol = %(symbol)s AND timeframe = '1m' AND ts >= %(since)s
+            ) AS minute_candles
+            GROUP BY bucket
+            ON CONFLICT (symbol, timeframe, ts) DO UPDATE SET
+                open = EXCLUDED.open,
+                high = EXCLUDED.high,
+                low = EXCLUDED.low,
+                close = EXCLUDED.close,
+                volume = EXCLUDED.volume
+            RETURNING ts, xmax = 0 AS is_new
+        )
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE is_new), MAX(ts) FROM upserted;
+    """, {"symbol": symbol, "timeframe": timeframe, "secs": bucket_seconds, "since": since})
+    upserted, new_rows, last_ts = cur.fetchone()
+    return (new_rows, last_ts) if with_last_ts else upserted
+
+
+def verify_against_api(cur, symbol, timeframe, sample_size):
+    "Compare the last `sample_size` derived candles with what Coinbase serves. Returns mismatches."
+    from async_fetcher import fetch_candles  # only needed when verifying
+
+    pair = symbol.replace('-', '').lower()
+    granularity = TIMEFRAME_SECONDS[timeframe]
+    end_ts = int(time.time()) // granularity * granularity  # skip the in-progress candle
+    start_ts = end_ts - sample_size * granularity
+
+    from candle_store import CANDLE_STORE, CANDLES_TABLE
+
+    api_candles = fetch_candles(symbol, granularity, start_ts, end_ts)
+    window = (datetime.datetime.utcfromtimestamp(start_ts), datetime.datetime.utcfromtimestamp(end_ts))
+    if CANDLE_STORE == "unified":
+        cur.execute(f"""
+            SELECT ts, open, high, low, close, volume
+            FROM {CANDLES_TABLE}
+            WHERE symbol = %s AND timeframe = %s AND ts >= %s AND ts < %s;
+        """, (symbol, timeframe) + window)
+    else:
+        cur.execute(f"""
+            SELECT datetime, open, high, low, close, volume
+            FROM {pair}_{timeframe}
+            WHERE datetime >= %s AND datetime < %s;
+        """, window)
+    local = {row[0]: [float(v) for v in row[1:]] for row in cur.fetchall()}
+
+    mismatches = []
+    for ts, low, high, open_, close, volume in api_candles:
+        dt = datetime.datetime.utcfromtimestamp(int(ts))
+        if dt not in local:
+            mismatches.append((dt, "missing locally"))
+            continue
+        for name, api_value, local_value in zip(
+            ["open", "high", "low", "close", "volume"],
+            [open_, high, low, close, volume],
+            local[dt],
+        ):
+            api_value = float(api_value)
+            if abs(api_value - local_value) > VERIFY_TOLERANCE * max(abs(api_value), 1e-12):
+                mismatches.append((dt, f"{name}: api={api_value} local={local_value}"))
+
+    if mismatches:
+        print(f"⚠️ {symbol} {timeframe}: {len(mismatches)} mismatches vs API in last {sample_size} candles")
+        for dt, detail in mismatches[:10]:
+            print(f"   {dt} → {detail}")
+    else:
+        print(f"✅ {symbol} {timeframe}: last {len(api_candles)} derived candles match the API")
+    return mismatches
@@ -0,0 +1,136 @@
+'''
+On-disk cache of raw Coinbase /candles responses, so re-runs don't refetch finished windows.
+
+Entries are keyed by (candles URL, granularity, start, end) — the URL carries the product and
+the server, so fake-server runs never mix with real data — and stored zlib-compressed under a
+hash of that key (data/response_cache/ab/abcdef....z). Only windows that are fully in the
+past are cached — the newest candles can still change, so those always hit the API.
+
+Old entries are dropped after RESPONSE_CACHE_MAX_AGE_DAYS, and the oldest ones are evicted
+once the cache grows past RESPONSE_CACHE_MAX_MB.
+
+Usage:
+    from response_cache import get_cache
+    cache = get_cache()
+    url = f"{BASE_URL}/products/BTC-USD/candles"
+    body = cache.get(url, 60, (start_ts, end_ts))   # bytes or None
+    cache.put(url, 60, (start_ts, end_ts), response.content)
+
+Disable with RESPONSE_CACHE=false, or move it with RESPONSE_CACHE_DIR.
+'''
+
+# ===== Imports =====
+import hashlib
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from dotenv import load_dotenv
+
+# === Load .env ===
+project_root = Path(__file__).resolve().parent.parent
+load_dotenv(project_root / ".env")
+
+# === CONFIG ===
+CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "True").lower() == "true"
+CACHE_DIR = Path(os.getenv("RESPONSE_CACHE_DIR", project_root / "data" / "response_cache"))
+MAX_BYTES = int(float(os.getenv("RESPONSE_CACHE_MAX_MB", "512")) * 1024 * 1024)
+MAX_AGE_SECONDS = float(os.getenv("RESPONSE_CACHE_MAX_AGE_DAYS", "30")) * 86400
+SETTLE_CANDLES = 2  # a window is final once its last candle is this many candles old
+
+
+def is_final(window, granularity, now=None):
+    "True once every candle in the window has closed (and had a moment to settle)"
+    now = time.time() if now is None else now
+    return window[1] + SETTLE_CANDLES * granularity <= now
+
+
+class ResponseCache:
+    "Compressed, content-addressed response store with age + size eviction"
+
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES, max_age=MAX_AGE_SECONDS):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # bytes on disk, counted on first put
+        self._lock = threading.Lock()
+
+    def _file(self, url, granularity, window):
+        key = f"{url}|{int(granularity)}|{int(window[0])}|{int(window[1])}"
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return self.path / digest[:2] / f"{digest}.z"
+
+    def get(self, url, granularity, window):
+        "Cached response body, or None"
+        file = self._file(url, granularity, window)
+        try:
+            if time.time() - file.stat().st_mtime > self.max_age:
+                file.unlink(missing_ok=True)
+                self.misses += 1
+                return None
+            body = zlib.decompress(file.read_bytes())
+        except (OSError, zlib.error):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return body
+
+    def put(self, url, granularity, window, body):
+        "Store a response body (only call this for final windows)"
+        file = self._file(url, granularity, window)
+        data = zlib.compress(body, 6)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = file.with_suffix(f".tmp{threading.get_ident()}")
+        tmp.write_bytes(data)
+        os.replace(tmp, file)  # never leave a half-written entry behind
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(f.stat().st_size for f in self.path.glob("*/*.z"))
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        "Drop expired entries, then the oldest ones until we're back under 90% of the limit"
+        now = time.time()
+        entries = []
+        for f in self.path.glob("*/*.z"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+        entries.sort()
+        size = sum(e[1] for e in entries)
+        target = self.max_bytes * 0.9
+        for mtime, nbytes, f in entries:
+            if size <= target and now - mtime <= self.max_age:
+                break
+            f.unlink(missing_ok=True)
+            size -= nbytes
+        self._size = size
+
+    def clear(self):
+        for f in self.path.glob("*/*.z"):
+            f.unlink(missing_ok=True)
+        self._size = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    "Process-wide cache, or None when RESPONSE_CACHE=false"
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
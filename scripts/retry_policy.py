@@ -0,0 +1,177 @@
+'''
+Shared retry + pacing engine for every Coinbase request.
+
+- 429 and 5xx are retried with jittered exponential backoff ("full jitter").
+- Retry-After on a 429 pauses ALL requests in the process, not just the one that was throttled.
+- The request rate adapts AIMD-style: it creeps up while requests succeed and is halved
+  when Coinbase throttles us, so we sit just under whatever the real limit is.
+- A per-run retry budget stops a bad outage from turning into thousands of retries.
+
+Usage:
+    from retry_policy import get_with_retry
+    response = get_with_retry(url, params=params)     # sync scripts
+
+    pacer = get_pacer()                                # async_fetcher shares the same pacer
+    await asyncio.sleep(pacer.reserve())
+
+Tune from .env if needed:
+    FETCH_RATE_PER_SEC=8        # starting rate
+    FETCH_MAX_RATE_PER_SEC=10   # never go above this (Coinbase public limit)
+    FETCH_MIN_RATE_PER_SEC=0.5  # never back off below this
+    FETCH_RETRY_BUDGET=500      # retries allowed per run (all requests together)
+'''
+
+# ===== Imports =====
+import email.utils
+import os
+import random
+import threading
+import time
+from http_client import get_session
+
+# === CONFIG ===
+RATE_PER_SEC = float(os.getenv("FETCH_RATE_PER_SEC", "8"))
+MAX_RATE_PER_SEC = float(os.getenv("FETCH_MAX_RATE_PER_SEC", "10"))
+MIN_RATE_PER_SEC = float(os.getenv("FETCH_MIN_RATE_PER_SEC", "0.5"))
+RETRY_BUDGET = int(os.getenv("FETCH_RETRY_BUDGET", "500"))
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_CAP = 30    # seconds
+RATE_STEP = 0.5     # req/s added per second of clean responses
+RATE_DECREASE = 0.5 # multiply the rate by this on a 429
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    "Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]"
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after_seconds(response):
+    "Seconds from a Retry-After header (delta-seconds or HTTP date), or None"
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class AdaptivePacer:
+    """Thread-safe AIMD request pacer.
+
+    reserve() books the next send slot and returns how long to sleep before sending,
+    so it works the same from threads (time.sleep) and coroutines (asyncio.sleep)."""
+
+    def __init__(self, rate=RATE_PER_SEC, max_rate=MAX_RATE_PER_SEC, min_rate=MIN_RATE_PER_SEC):
+        self.max_rate = max(max_rate, rate)
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.next_slot = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot, self.paused_until)
+            self.next_slot = slot + 1 / self.rate
+            return slot - now
+
+    def on_success(self):
+        "Additive increase: about RATE_STEP req/s more for every second of clean responses"
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + RATE_STEP / self.rate)
+
+    def on_throttle(self, retry_after=None):
+        "Multiplicative decrease, at most once per second (in-flight requests 429 together)"
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if now - self.last_decrease >= 1:
+                self.rate = max(self.min_rate, self.rate * RATE_DECREASE)
+                self.last_decrease = now
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+
+
+class RetryBudget:
+    "Retries allowed for the whole run, shared by every request"
+
+    def __init__(self, retries=RETRY_BUDGET):
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def spend(self):
+        "Take one retry; False once the budget is used up"
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+_pacer = None
+_budget = None
+_lock = threading.Lock()
+
+
+def get_pacer():
+    "Process-wide pacer (Coinbase limits per IP, so all fetches share it)"
+    global _pacer
+    with _lock:
+        if _pacer is None:
+            _pacer = AdaptivePacer()
+        return _pacer
+
+
+def get_budget():
+    "Process-wide retry budget for this run"
+    global _budget
+    with _lock:
+        if _budget is None:
+            _budget = RetryBudget()
+        return _budget
+
+
+def retry_delay(response, attempt, pacer, budget):
+    """Feed a response into the pacer. Returns None if it should not be retried,
+    otherwise the seconds to wait before trying again."""
+    status = response.status_code
+    if status == 200:
+        pacer.on_success()
+        return None
+    retry_after = None
+    if status == 429:
+        retry_after = retry_after_seconds(response)
+        pacer.on_throttle(retry_after)
+    if status not in RETRY_STATUSES or attempt + 1 >= MAX_ATTEMPTS or not budget.spend():
+        return None
+    if retry_after is not None:
+        return retry_after + random.uniform(0, BACKOFF_BASE)
+    return backoff_delay(attempt)
+
+
+def get_with_retry(url, params=None, headers=None, pacer=None, budget=None):
+    "Paced GET with 429/5xx retries. Returns the last response (check status_code)."
+    pacer = pacer or get_pacer()
+    budget = budget or get_budget()
+    session = get_session()
+    attempt = 0
+    while True:
+        time.sleep(pacer.reserve())
+        response = session.get(url, params=params, headers=headers)
+        wait_sec = retry_delay(response, attempt, pacer, budget)
+        if wait_sec is None:
+            return response
+        print(f"⚠️  {response.status_code} → retry in {wait_sec:.1f}s ({pacer.rate:.1f} req/s)")
+        time.sleep(wait_sec)
+        attempt += 1
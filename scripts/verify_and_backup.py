@@ -23,11 +23,11 @@ renamed = []
 missing_in_backup = []
 
 
-# === Loop over all historical .csv files ===
-for hist_file in historical_dir.glob("*.csv"):
+# === Loop over all historical files (.csv or .parquet, see historical_store.py) ===
+for hist_file in sorted(historical_dir.glob("*.csv")) + sorted(historical_dir.glob("*.parquet")):
     # Extract pair + timeframe for standardized name
     pair_timeframe = hist_file.stem.split("=")[0]  # e.g., BTCUSD-1d
-    target_backup_name = f"{pair_timeframe}=backup.csv"
+    target_backup_name = f"{pair_timeframe}=backup{hist_file.suffix}"
     backup_file = backup_dir / target_backup_name
 
     # --- Check for legacy backup files ---
@@ -54,6 +54,26 @@ for hist_file in historical_dir.glob("*.csv"):
         print(f"🆕 Created: {backup_file.name} (was missing in backup)")
         missing_in_backup.append(backup_file.name)
 
+# === Partitioned series (historical/BTCUSD-1m/2025-06.parquet): only changed partitions are copied ===
+for hist_folder in sorted(p for p in historical_dir.iterdir() if p.is_dir()):
+    backup_folder = backup_dir / f"{hist_folder.name}=backup"
+    backup_folder.mkdir(exist_ok=True)
+    same = 0
+    for hist_file in sorted(hist_folder.glob("*.parquet")):
+        backup_file = backup_folder / hist_file.name
+        label = f"{backup_folder.name}/{hist_file.name}"
+        if not backup_file.exists():
+            shutil.copy2(hist_file, backup_file)
+            print(f"🆕 Created: {label} (was missing in backup)")
+            missing_in_backup.append(label)
+        elif filecmp.cmp(hist_file, backup_file, shallow=False):
+            same += 1
+        else:
+            shutil.copy2(hist_file, backup_file)
+            print(f"🔄 Updated: {label} (new version copied)")
+            copied.append(label)
+    print(f"✅ Synced partitions: {backup_folder.name} ({same} unchanged)")
+
 # === Final summary ===
 print("\n=== ✅ BACKUP SYNC SUMMARY ===")
 print(f"Unchanged: {unchanged if unchanged else 'None'}")
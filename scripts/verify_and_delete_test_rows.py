@@ -9,6 +9,8 @@
 
 5. Prints the new latest timestamp for confidence.
 
+6. Resets the series' ingest_state row, so the orchestrator re-seeds its watermark and refetches the deleted rows.
+
 Run BEFORE you run the orchestrator for testing purposes. 
 
 '''
@@ -17,6 +19,9 @@ import psycopg2
 from dotenv import load_dotenv
 import os
 from pathlib import Path
+from candle_store import symbol_from_pair
+from db_utils import transaction
+from ingest_state import reset_state
 
 # === Load .env ===
 project_root = Path(__file__).resolve().parent.parent
@@ -69,8 +74,11 @@ try:
                 LIMIT {ROWS_TO_DELETE}
             );
             """
-            cur.execute(delete_query)
-            print(f"🗑️ Deleted {cur.rowcount} rows from {table}")
+            with transaction(cur):  # delete + watermark reset commit together
+                cur.execute(delete_query)
+                deleted = cur.rowcount
+                reset_state(cur, symbol_from_pair(pair), tf)
+            print(f"🗑️ Deleted {deleted} rows from {table} (ingest_state reset)")
 
             # === Show new latest timestamp ===
             cur.execute(f"SELECT MAX(datetime) FROM {table};")